@@ -0,0 +1,163 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from instrumentation import StageTimer, log_render, profile_render
+from pdf_cache import default_cache
+from quotation import HEADER_FIELDS, normalize_quotation, quotation_filename
+from quote_numbers import default_allocator
+from renderer import build_quotation_pdf
+
+# Quotation-level CSV columns; every other column describes a line item
+CSV_QUOTE_FIELDS = HEADER_FIELDS + ["discount", "tax_rate", "terms", "logo_path"]
+CSV_ITEM_FIELDS = ["description", "quantity", "unit_price"]
+
+
+def read_jsonl(path):
+    # Yields (where, text) per non-blank line; the JSON is decoded by
+    # load_quotations, so one bad line only fails its own quotation
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if line:
+                yield f"line {line_no}", line
+
+
+def read_csv(path):
+    # One CSV row per line item; consecutive rows sharing a quote number are
+    # grouped into a single quotation. Yields (where, record).
+    current = None
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            quote_number = (row.get("quote_number") or "").strip()
+            if current is None or quote_number != current["quote_number"]:
+                if current is not None:
+                    yield rows_label(first_line, last_line), current
+                first_line = reader.line_num
+                current = {field: row.get(field) for field in CSV_QUOTE_FIELDS if row.get(field)}
+                current["quote_number"] = quote_number
+                current["items"] = []
+            last_line = reader.line_num
+            if (row.get("description") or "").strip():
+                current["items"].append({field: row.get(field) for field in CSV_ITEM_FIELDS})
+    if current is not None:
+        yield rows_label(first_line, last_line), current
+
+
+def rows_label(first_line, last_line):
+    if first_line == last_line:
+        return f"row {first_line}"
+    return f"rows {first_line}-{last_line}"
+
+
+def load_quotations(path):
+    # Returns (quotations, failures). A quotation that cannot be read is
+    # listed in failures as (where, error) and the rest still load.
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        records, decode = read_csv(path), dict
+    elif ext in (".jsonl", ".json", ".ndjson"):
+        records, decode = read_jsonl(path), json.loads
+    else:
+        raise ValueError(f"Unsupported input format: {ext or path}")
+    quotations = []
+    failures = []
+    for where, record in records:
+        try:
+            quotations.append(normalize_quotation(decode(record)))
+        except (ValueError, TypeError, AttributeError) as e:
+            failures.append((where, str(e)))
+    return quotations, failures
+
+
+def render_one(quotation, output_dir):
+    # Runs inside a worker process; errors are returned rather than raised so
+    # one bad quote does not abort the whole batch
+    start = time.perf_counter()
+    timer = StageTimer()
+    number = None
+    try:
+        if not quotation["quote_number"]:
+            # Numbered here, from this worker's own block of numbers
+            number = default_allocator().next_number()
+            quotation = dict(quotation, quote_number=number)
+        file_path = os.path.join(output_dir, quotation_filename(quotation["quote_number"]))
+        render = lambda q, path: build_quotation_pdf(q, path, timer=timer)
+        cache_hit = default_cache().render_to(quotation, file_path, render=render)
+        return {"quote_number": quotation["quote_number"], "file_path": file_path, "error": None,
+                "seconds": time.perf_counter() - start, "stages": timer.as_millis(),
+                "cache_hit": cache_hit, "output_bytes": os.path.getsize(file_path)}
+    except Exception as e:
+        if number:
+            # The quote was not rendered, so its number is issued again
+            default_allocator().return_number(number)
+            quotation = dict(quotation, quote_number="")
+        return {"quote_number": quotation["quote_number"], "file_path": None, "error": str(e),
+                "seconds": time.perf_counter() - start, "stages": timer.as_millis(),
+                "cache_hit": False, "output_bytes": None}
+
+
+def render_batch(quotations, output_dir, workers=None, report=print):
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(quotations) // (workers * 8))
+
+    start = time.perf_counter()
+    rendered = failed = 0
+    render_time = 0.0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(render_one, quotations, [output_dir] * len(quotations),
+                           chunksize=chunksize)
+        for quotation, result in zip(quotations, results):
+            # Quotes without a number were given one by their worker
+            quote_number = quotation["quote_number"] = result["quote_number"]
+            elapsed = result["seconds"]
+            render_time += elapsed
+            # Workers only report timings; the render log is written here
+            log_render(quotation, result["stages"], outcome="error" if result["error"] else "ok",
+                       output_bytes=result["output_bytes"], cache_hit=result["cache_hit"],
+                       error=result["error"], source="batch")
+            if result["error"]:
+                failed += 1
+                report(f"FAILED  {quote_number or '<no quote #>'}  {elapsed * 1000:8.1f} ms  {result['error']}")
+            else:
+                rendered += 1
+                report(f"OK      {quote_number}  {elapsed * 1000:8.1f} ms  {result['file_path']}")
+    wall_time = time.perf_counter() - start
+
+    summary = {
+        "quotes": len(quotations),
+        "rendered": rendered,
+        "failed": failed,
+        "workers": workers,
+        "wall_seconds": wall_time,
+        "mean_render_ms": render_time / len(quotations) * 1000 if quotations else 0.0,
+        "quotes_per_second": len(quotations) / wall_time if wall_time else 0.0,
+    }
+    report(f"Rendered {rendered}/{len(quotations)} quotations ({failed} failed) "
+           f"in {wall_time:.2f}s with {workers} workers: "
+           f"{summary['quotes_per_second']:.1f} quotes/s, "
+           f"{summary['mean_render_ms']:.1f} ms mean per quote")
+    return summary
+
+
+def profile_one(quotation, output_dir, report=print):
+    # Render a single quotation in-process, bypassing the PDF cache, under
+    # cProfile and tracemalloc
+    os.makedirs(output_dir, exist_ok=True)
+    file_path = os.path.join(output_dir, quotation_filename(quotation["quote_number"] or "profile"))
+    timer = StageTimer()
+    result = profile_render(lambda: build_quotation_pdf(quotation, file_path, timer=timer), output_dir)
+    log_render(quotation, timer.as_millis(), output_bytes=os.path.getsize(file_path), source="profile")
+
+    report(f"Profiled {quotation['quote_number']} ({len(quotation['items'])} items) "
+           f"in {result['seconds']:.3f}s, peak {result['peak_kb']} KB")
+    for stage, millis in timer.as_millis().items():
+        report(f"  {stage:<16} {millis:10.2f} ms")
+    report(f"cProfile stats:      {result['profile']}")
+    report(f"tracemalloc snapshot: {result['snapshot']}")
+    report(f"Summary:             {result['report']}")
+    return result
@@ -0,0 +1,262 @@
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import renderer
+from instrumentation import StageTimer
+from quotation import normalize_quotation
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "pipeline.json")
+DEFAULT_SIZES = [10, 1000, 50000]
+
+WORDS = ("gate", "grille", "box bar", "angle iron", "flat bar", "pipe", "sheet", "hinge",
+         "welding", "painting", "labour", "transport", "roller", "lock", "frame", "mesh")
+
+
+def synthetic_quotation(item_count, seed=0):
+    rng = random.Random(seed)
+    items = []
+    for i in range(item_count):
+        # Mostly short one-line descriptions with some long wrapping ones
+        length = rng.choice((2, 3, 4, 4, 5, 18))
+        items.append({
+            "description": " ".join(rng.choice(WORDS) for _ in range(length)).capitalize(),
+            "quantity": rng.choice(("1", "2", "2.5", "10", "0.75")),
+            "unit_price": f"{rng.uniform(100, 250000):.2f}",
+        })
+    return normalize_quotation({
+        "quote_number": f"BENCH-{item_count}",
+        "issue_date": "2026-01-01",
+        "valid_until": "2026-01-08",
+        "customer_id": "C-0001",
+        "customer_name": "Benchmark Customer",
+        "customer_phone": "0700000000",
+        "customer_address": "No 1, Main Street, Colombo",
+        "items": items,
+        "discount": "1500.00",
+        "tax_rate": "18",
+    })
+
+
+def measure(fn, repeat=1, setup=None):
+    # Best wall time over `repeat` runs, then one extra traced run for peak
+    # memory (tracemalloc slows execution, so it is kept out of the timing)
+    best = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": round(best, 6), "peak_kb": peak // 1024}
+
+
+def bench_render(item_count, repeat):
+    # The stages generate_quotation runs in sequence, timed separately
+    quotation = synthetic_quotation(item_count)
+    results = {}
+    state = {}
+
+    results["styles_header"] = measure(
+        lambda: renderer.get_render_context(None),
+        repeat, setup=renderer.clear_render_context_cache)
+
+    # The flowable list. Quotes over LARGE_QUOTE_ITEMS items get a lazy
+    # item table here, so their rows are only formatted and laid out in
+    # doc_build; table_layout reports that share of doc_build.
+    def assemble():
+        state["elements"] = renderer.build_elements(quotation)
+    results["elements"] = measure(assemble, repeat)
+
+    layout_times = []
+
+    def build():
+        timer = StageTimer()
+        state["buffer"] = io.BytesIO()
+        renderer.new_document(state["buffer"]).build(renderer.build_elements(quotation, timer))
+        layout_times.append(timer.stages.get("table_layout", 0.0))
+    results["doc_build"] = measure(build, repeat)
+    # The last run is the traced one, which is too slow to count
+    results["table_layout"] = {"seconds": round(min(layout_times[:-1]), 6), "peak_kb": None}
+
+    out_dir = tempfile.mkdtemp(prefix="aiw-bench-")
+    try:
+        path = os.path.join(out_dir, "quotation.pdf")
+        data = state["buffer"].getvalue()
+
+        def write():
+            with open(path, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        results["file_write"] = measure(write, repeat)
+        results["file_write"]["bytes"] = len(data)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return results
+
+
+def start_virtual_display():
+    # Returns the Xvfb process started for the GUI benchmarks, or None when a
+    # display is already available
+    if os.environ.get("DISPLAY"):
+        return None
+    if not shutil.which("Xvfb"):
+        raise RuntimeError("no DISPLAY and Xvfb is not installed")
+    display = ":99"
+    proc = subprocess.Popen(["Xvfb", display, "-screen", "0", "1280x1024x24", "-nolisten", "tcp"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(1.0)
+    if proc.poll() is not None:
+        raise RuntimeError("Xvfb failed to start")
+    os.environ["DISPLAY"] = display
+    return proc
+
+
+def bench_gui(item_count, repeat):
+    import tkinter as tk
+    from drafts import DraftJournal
+    from main import QuotationGenerator
+    from store import QuotationStore
+
+    root = tk.Tk()
+    root.withdraw()
+    draft_dir = tempfile.mkdtemp(prefix="aiw-bench-")
+    try:
+        app = QuotationGenerator(root, store=QuotationStore(":memory:"),
+                                 drafts=DraftJournal(os.path.join(draft_dir, "draft.jsonl")))
+        root.update()
+
+        def reset():
+            app.item_grid.load_rows([])
+            root.update()
+
+        def add_rows():
+            for _ in range(item_count):
+                app.add_item_row()
+            root.update_idletasks()
+        results = {"add_item_row": measure(add_rows, repeat, setup=reset)}
+
+        results["calculate_total"] = measure(app.calculate_total, max(repeat, 5))
+        app.drafts.close()
+        return results
+    finally:
+        root.destroy()
+        shutil.rmtree(draft_dir, ignore_errors=True)
+
+
+def run(sizes, repeat, gui):
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": {},
+    }
+    display = None
+    if gui:
+        try:
+            display = start_virtual_display()
+        except RuntimeError as e:
+            print(f"Skipping GUI benchmarks: {e}", file=sys.stderr)
+            gui = False
+    try:
+        for size in sizes:
+            # Very large quotes are only run once per stage
+            size_repeat = 1 if size >= 10000 else repeat
+            stages = bench_render(size, size_repeat)
+            if gui:
+                stages.update(bench_gui(size, size_repeat))
+            report["results"][str(size)] = stages
+            for stage, result in stages.items():
+                peak = "-" if result["peak_kb"] is None else result["peak_kb"]
+                print(f"{size:>6} items  {stage:<16} {result['seconds'] * 1000:10.2f} ms  "
+                      f"{peak:>8} KB peak")
+    finally:
+        if display is not None:
+            display.terminate()
+    return report
+
+
+def compare(report, baseline, time_tolerance, memory_tolerance):
+    # Returns a list of regressions against the baseline
+    regressions = []
+    for size, stages in report["results"].items():
+        for stage, result in stages.items():
+            base = baseline.get("results", {}).get(size, {}).get(stage)
+            if not base:
+                continue
+            if result["seconds"] > base["seconds"] * time_tolerance:
+                regressions.append(f"{size} items {stage}: {result['seconds']:.4f}s "
+                                   f"vs baseline {base['seconds']:.4f}s")
+            if result["peak_kb"] is None or base["peak_kb"] is None:
+                continue
+            if result["peak_kb"] > base["peak_kb"] * memory_tolerance:
+                regressions.append(f"{size} items {stage}: {result['peak_kb']} KB "
+                                   f"vs baseline {base['peak_kb']} KB")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the quotation pipeline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="item counts of the synthetic quotations (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage; the best is kept")
+    parser.add_argument("--no-gui", action="store_true", help="skip the Tk widget benchmarks")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--check", action="store_true",
+                        help="exit with status 1 if any stage regressed against the baseline")
+    parser.add_argument("--time-tolerance", type=float, default=1.25)
+    parser.add_argument("--memory-tolerance", type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.repeat, gui=not args.no_gui)
+
+    if args.check:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; run with --save first", file=sys.stderr)
+            return 1
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.time_tolerance, args.memory_tolerance)
+        for regression in regressions:
+            print(f"REGRESSION  {regression}")
+        if regressions:
+            return 1
+        print("No regressions against baseline")
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
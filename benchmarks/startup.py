@@ -0,0 +1,96 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+from bench_pipeline import start_virtual_display
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy packages that the GUI loads only after its window is up
+DEFERRED_MODULES = ("reportlab", "PIL", "numpy", "fitz", "concurrent.futures.process")
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+FIRST_FRAME = """
+import os, tempfile, time
+start = time.perf_counter()
+import tkinter as tk
+import main
+from drafts import DraftJournal
+from store import QuotationStore
+root = tk.Tk()
+drafts = DraftJournal(os.path.join(tempfile.mkdtemp(), "draft.jsonl"))
+app = main.QuotationGenerator(root, store=QuotationStore(":memory:"), drafts=drafts)
+root.update()
+print(time.perf_counter() - start)
+app.on_close()
+"""
+
+
+def import_times(module="main"):
+    # Returns [(module, self µs, cumulative µs, depth)] from a fresh interpreter
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True, check=True)
+    entries = []
+    for line in proc.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+
+def first_frame_seconds():
+    proc = subprocess.run([sys.executable, "-c", FIRST_FRAME],
+                          cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(proc.stdout.split()[0])
+
+
+def deferred_imports(entries):
+    return sorted(name for name, _, _, _ in entries
+                  if any(name == m or name.startswith(m + ".") for m in DEFERRED_MODULES))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure GUI cold-start time")
+    parser.add_argument("--repeat", type=int, default=5, help="runs; the best is reported")
+    parser.add_argument("--top", type=int, default=10, help="slowest direct imports to list")
+    parser.add_argument("--no-gui", action="store_true", help="skip the time-to-first-frame run")
+    parser.add_argument("--check", action="store_true",
+                        help="exit with status 1 if `import main` loads any deferred package")
+    args = parser.parse_args(argv)
+
+    runs = [import_times() for _ in range(args.repeat)]
+    best = min(runs, key=lambda entries: entries[-1][2])
+    print(f"import main: {best[-1][2] / 1000:.1f} ms (best of {args.repeat}, -X importtime)")
+    print("Slowest imports made directly by main:")
+    direct = [entry for entry in best if entry[3] == 1]
+    for name, self_us, cumulative_us, depth in sorted(direct, key=lambda e: -e[2])[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    if not args.no_gui:
+        display = None
+        try:
+            display = start_virtual_display()
+            seconds = min(first_frame_seconds() for _ in range(args.repeat))
+            print(f"Time to first frame: {seconds * 1000:.1f} ms (best of {args.repeat})")
+        except (RuntimeError, subprocess.CalledProcessError) as e:
+            print(f"Skipping time to first frame: {e}", file=sys.stderr)
+        finally:
+            if display is not None:
+                display.terminate()
+
+    loaded = deferred_imports(best)
+    if loaded:
+        print(f"Loaded at startup but should be deferred: {', '.join(loaded)}")
+        if args.check:
+            return 1
+    else:
+        print("No deferred packages loaded at startup")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+import bisect
+import csv
+import marshal
+import os
+import threading
+import zlib
+from array import array
+from itertools import accumulate, chain
+from operator import sub
+
+from pricing import to_cents
+from settings import CATALOG_INDEX_PATH, CATALOG_PATH
+from sinks import atomic_writer
+
+INDEX_VERSION = 1
+# Most substring candidates checked per search
+SCAN_LIMIT = 4096
+
+
+def search_key(text):
+    return " ".join(text.lower().split())
+
+
+def trigrams(key):
+    # Padded with a leading space so one- and two-letter words still index
+    padded = f" {key}"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Catalog:
+    # Products and labour rates for the description autocomplete. Entries are
+    # kept sorted by their lowercased description in parallel lists, so prefix
+    # matches are a bisect; substring matches go through a trigram index of
+    # entry positions. Nothing is read from disk until the first search.
+    def __init__(self, path=CATALOG_PATH, index_path=CATALOG_INDEX_PATH):
+        self.path = path
+        self.index_path = index_path
+        self.keys = []
+        self.descriptions = []
+        self.skus = []
+        self.units = []
+        self.unit_prices = array("q")
+        self.postings = {}
+        self.loaded = False
+        self._lock = threading.Lock()
+        self._loader = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def load(self):
+        with self._lock:
+            if self.loaded:
+                return
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                # No catalog yet; autocomplete simply offers nothing
+                self.loaded = True
+                return
+            if not self._read_index(mtime):
+                self._build(self._read_csv())
+                self._write_index(mtime)
+            self.loaded = True
+
+    def load_async(self):
+        # Build the index off the Tk thread; search() returns nothing until done
+        if self.loaded or self._loader is not None:
+            return
+        self._loader = threading.Thread(target=self.load, daemon=True)
+        self._loader.start()
+
+    def _read_csv(self):
+        entries = []
+        with open(self.path, newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                description = " ".join((row.get("description") or "").split())
+                if not description:
+                    continue
+                try:
+                    unit_price = to_cents(row.get("unit_price") or 0)
+                except ValueError:
+                    continue
+                entries.append((search_key(description), description,
+                                (row.get("sku") or "").strip(), (row.get("unit") or "").strip(),
+                                unit_price))
+        return entries
+
+    def _build(self, entries):
+        entries.sort()
+        postings = {}
+        for position, entry in enumerate(entries):
+            for gram in trigrams(entry[0]):
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = array("I")
+                posting.append(position)
+        self.keys = [entry[0] for entry in entries]
+        self.descriptions = [entry[1] for entry in entries]
+        self.skus = [entry[2] for entry in entries]
+        self.units = [entry[3] for entry in entries]
+        self.unit_prices = array("q", (entry[4] for entry in entries))
+        self.postings = postings
+
+    def _read_index(self, mtime):
+        # The compiled index is reused while the CSV is unchanged
+        try:
+            with open(self.index_path, "rb") as f:
+                data = marshal.loads(zlib.decompress(f.read()))
+        except (OSError, EOFError, ValueError, TypeError, zlib.error):
+            return False
+        if data.get("version") != INDEX_VERSION or data.get("source_mtime") != mtime:
+            return False
+        self.descriptions = data["descriptions"]
+        self.keys = [search_key(description) for description in self.descriptions]
+        self.skus = data["skus"]
+        self.units = data["units"]
+        self.unit_prices = array("q")
+        self.unit_prices.frombytes(data["unit_prices"])
+        counts = array("I")
+        counts.frombytes(data["counts"])
+        deltas = array("I")
+        deltas.frombytes(data["deltas"])
+        self.postings = {}
+        offset = 0
+        for gram, count in zip(data["grams"], counts):
+            self.postings[gram] = array("I", accumulate(deltas[offset:offset + count]))
+            offset += count
+        return True
+
+    def _write_index(self, mtime):
+        # Posting lists are stored as gaps between positions, which are small
+        # and compress well; the whole index ends up smaller than the CSV
+        grams = list(self.postings)
+        counts = array("I", (len(self.postings[gram]) for gram in grams))
+        deltas = array("I")
+        for gram in grams:
+            posting = self.postings[gram]
+            deltas.extend(map(sub, posting, chain((0,), posting)))
+        data = {
+            "version": INDEX_VERSION,
+            "source_mtime": mtime,
+            "descriptions": self.descriptions,
+            "skus": self.skus,
+            "units": self.units,
+            "unit_prices": self.unit_prices.tobytes(),
+            "grams": grams,
+            "counts": counts.tobytes(),
+            "deltas": deltas.tobytes(),
+        }
+        try:
+            # Only a cache, so it is not fsynced
+            with atomic_writer(self.index_path, fsync=False) as f:
+                f.write(zlib.compress(marshal.dumps(data)))
+        except OSError:
+            pass
+
+    def entry(self, position):
+        return {
+            "sku": self.skus[position],
+            "description": self.descriptions[position],
+            "unit": self.units[position],
+            "unit_price": self.unit_prices[position],
+        }
+
+    def search(self, text, limit=10):
+        # Entries starting with text first (in order), then entries containing it
+        if not self.loaded:
+            self.load_async()
+            return []
+        key = search_key(text)
+        if not key:
+            return []
+
+        positions = []
+        start = bisect.bisect_left(self.keys, key)
+        stop = bisect.bisect_left(self.keys, key + "\uffff", start)
+        positions.extend(range(start, min(stop, start + limit)))
+
+        if len(positions) < limit and len(key) >= 2:
+            # A two-letter query only matches at the start of a word
+            grams = trigrams(key) if len(key) < 3 else {key[i:i + 3] for i in range(len(key) - 2)}
+            # Walk the shortest posting list and check the others by substring
+            candidates = None
+            for gram in grams:
+                posting = self.postings.get(gram)
+                if posting is None:
+                    return [self.entry(p) for p in positions]
+                if candidates is None or len(posting) < len(candidates):
+                    candidates = posting
+            # Candidates are checked in growing blocks, up to a fixed budget, so
+            # a query made of very common trigrams cannot stall typing
+            keys = self.keys
+            offset, block = 0, 64
+            end = min(len(candidates), SCAN_LIMIT)
+            while offset < end and len(positions) < limit:
+                positions += [p for p in candidates[offset:offset + block]
+                              if key in keys[p] and not start <= p < stop]
+                offset += block
+                block *= 2
+            del positions[limit:]
+        return [self.entry(p) for p in positions]
+
+    def lookup(self, description):
+        # Exact (case-insensitive) match, or None
+        key = search_key(description)
+        position = bisect.bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            return self.entry(position)
+        return None
+
@@ -0,0 +1,358 @@
+import bisect
+import os
+import re
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from operator import itemgetter
+
+from catalog import search_key
+from settings import COUNTRY_CODE, DATABASE_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    customer_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT '',
+    phone TEXT NOT NULL DEFAULT '',
+    address TEXT NOT NULL DEFAULT '',
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# A customer record uses the quotation's field names, so a quotation can be
+# saved as a customer and a customer copied straight into the form
+CUSTOMER_FIELDS = ["customer_id", "customer_name", "customer_phone", "customer_address"]
+# Recently used customers kept whole in memory and suggested first
+RECENT_CUSTOMERS = 50
+# Shortest run of digits searched as a phone number
+MIN_PHONE_DIGITS = 3
+# Most index entries checked per search
+SCAN_LIMIT = 4096
+
+# Adds or updates a customer; a blank field does not erase what is on file
+UPSERT_CUSTOMER = (
+    "INSERT INTO customers (customer_id, name, phone, address) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (customer_id) DO UPDATE SET "
+    "name = COALESCE(NULLIF(excluded.name, ''), name), "
+    "phone = COALESCE(NULLIF(excluded.phone, ''), phone), "
+    "address = COALESCE(NULLIF(excluded.address, ''), address), "
+    "updated_at = CURRENT_TIMESTAMP")
+
+
+_NON_DIGITS = re.compile(r"\D+")
+
+
+def phone_digits(text):
+    return _NON_DIGITS.sub("", text)
+
+
+def national_digits(digits):
+    # The number as dialled within the country, with its leading 0:
+    # +94 77 156 4842 and 0094 77 156 4842 both become 0771564842. Works on
+    # the start of a number too, so it applies to what has been typed so far.
+    for prefix in ("00" + COUNTRY_CODE, COUNTRY_CODE):
+        if digits.startswith(prefix):
+            return "0" + digits[len(prefix):]
+    return digits
+
+
+def customer_values(record):
+    # UPSERT_CUSTOMER parameters from a record with the CUSTOMER_FIELDS (a
+    # quotation will do), with whitespace tidied
+    return [" ".join(str(record.get(field) or "").split()) for field in CUSTOMER_FIELDS]
+
+
+def seed_customers(conn):
+    # An empty directory starts with the customers of the saved quotations,
+    # each as on their latest quote. Runs in the caller's transaction.
+    if conn.execute("SELECT EXISTS (SELECT 1 FROM customers)").fetchone()[0]:
+        return
+    conn.execute(
+        "INSERT OR IGNORE INTO customers (customer_id, name, phone, address) "
+        "SELECT customer_id, customer_name, customer_phone, customer_address "
+        "FROM quotations WHERE customer_id != '' ORDER BY issue_date DESC, id DESC")
+
+
+def index_keys(customer_id, name, phone):
+    # Search keys for one customer: the words of the name and ID (prefix
+    # matched), the phone number's digits (prefix matched) and the same
+    # digits reversed, so the end of the number is a prefix too
+    words = set(f"{name} {customer_id}".lower().split())
+    digits = phone_digits(phone)
+    if not digits:
+        return words, (), ()
+    numbers = {digits, national_digits(digits)}
+    return words, numbers, (digits[::-1],)
+
+
+class PrefixIndex:
+    # Sorted keys with the customer position of each in a parallel array.
+    # Sorting plain strings is several times faster than sorting (key,
+    # position) tuples, which matters for a 100k customer load.
+    def __init__(self, pairs=()):
+        pairs = list(pairs)
+        pairs.sort(key=itemgetter(0))
+        self.keys = [key for key, position in pairs]
+        self.positions = array("I", (position for key, position in pairs))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, position):
+        index = bisect.bisect_right(self.keys, key)
+        self.keys.insert(index, key)
+        self.positions.insert(index, position)
+
+    def remove(self, key, position):
+        index = bisect.bisect_left(self.keys, key)
+        while index < len(self.keys) and self.keys[index] == key:
+            if self.positions[index] == position:
+                del self.keys[index]
+                del self.positions[index]
+                return
+            index += 1
+
+    def prefix(self, prefix):
+        # Positions of the keys starting with prefix, in key order
+        start = bisect.bisect_left(self.keys, prefix)
+        stop = min(len(self.keys), start + SCAN_LIMIT)
+        for index in range(start, stop):
+            if not self.keys[index].startswith(prefix):
+                return
+            yield self.positions[index]
+
+
+class CustomerDirectory:
+    # Customers by Customer ID, stored in the quotation database. The ID,
+    # name and phone number of every customer are indexed in memory as sorted
+    # (key, position) lists, so a prefix of any word of the name or ID, or the
+    # start or end of the phone number, is found with a bisect. Addresses stay
+    # on disk until a customer is used; the most recently used customers are
+    # kept whole in an LRU and suggested first.
+    def __init__(self, path=DATABASE_PATH, recent_size=RECENT_CUSTOMERS):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.recent_size = recent_size
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.recent = OrderedDict()
+        self.ids = []
+        self.names = []
+        self.phones = []
+        self.positions = {}
+        self.words = PrefixIndex()
+        self.numbers = PrefixIndex()
+        self.tails = PrefixIndex()
+        self.loaded = False
+        # Customers saved before the index was built, added to it afterwards
+        self._pending = []
+        # Guards the connection, the index and the LRU
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loader = None
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def load(self):
+        with self._load_lock:
+            if self.loaded:
+                return
+            if self.path == ":memory:":
+                # Another connection would open a different, empty database
+                with self._lock:
+                    rows = self._read(self.conn)
+            else:
+                # A connection of its own, so lookups by ID carry on meanwhile
+                conn = sqlite3.connect(self.path, timeout=30)
+                try:
+                    conn.executescript(SCHEMA)
+                    rows = self._read(conn)
+                finally:
+                    conn.close()
+            ids, names, phones, words, numbers, tails = self._build(rows)
+            with self._lock:
+                self.ids, self.names, self.phones = ids, names, phones
+                self.positions = {customer_id: position for position, customer_id in enumerate(ids)}
+                self.words, self.numbers, self.tails = words, numbers, tails
+                for customer in self._pending:
+                    self._index(customer)
+                self._pending = []
+                self.loaded = True
+
+    def load_async(self):
+        # Build the index off the Tk thread; until it is done search() only
+        # offers recently used customers
+        if self.loaded or self._loader is not None:
+            return
+        self._loader = threading.Thread(target=self._load_in_background, daemon=True)
+        self._loader.start()
+
+    def _load_in_background(self):
+        try:
+            self.load()
+        finally:
+            # After a failure the next search tries again
+            self._loader = None
+
+    def _read(self, conn):
+        self._seed(conn)
+        return conn.execute("SELECT customer_id, name, phone FROM customers").fetchall()
+
+    def _seed(self, conn):
+        try:
+            with conn:
+                seed_customers(conn)
+        except sqlite3.OperationalError:
+            # No quotations table yet
+            pass
+
+    def _build(self, rows):
+        ids, names, phones = [], [], []
+        words, numbers, tails = [], [], []
+        for position, (customer_id, name, phone) in enumerate(rows):
+            ids.append(customer_id)
+            names.append(name)
+            phones.append(phone)
+            word_keys, number_keys, tail_keys = index_keys(customer_id, name, phone)
+            words.extend((key, position) for key in word_keys)
+            numbers.extend((key, position) for key in number_keys)
+            tails.extend((key, position) for key in tail_keys)
+        return ids, names, phones, PrefixIndex(words), PrefixIndex(numbers), PrefixIndex(tails)
+
+    def _index(self, customer):
+        # Add or update one customer in the in-memory index
+        customer_id = customer["customer_id"]
+        position = self.positions.get(customer_id)
+        if position is None:
+            position = len(self.ids)
+            self.positions[customer_id] = position
+            self.ids.append(customer_id)
+            self.names.append("")
+            self.phones.append("")
+        else:
+            old_keys = index_keys(customer_id, self.names[position], self.phones[position])
+            for index, old in zip((self.words, self.numbers, self.tails), old_keys):
+                for key in old:
+                    index.remove(key, position)
+        self.names[position] = customer["customer_name"]
+        self.phones[position] = customer["customer_phone"]
+        new_keys = index_keys(customer_id, customer["customer_name"], customer["customer_phone"])
+        for index, new in zip((self.words, self.numbers, self.tails), new_keys):
+            for key in new:
+                index.add(key, position)
+
+    def _remember(self, customer):
+        self.recent[customer["customer_id"]] = customer
+        self.recent.move_to_end(customer["customer_id"])
+        while len(self.recent) > self.recent_size:
+            self.recent.popitem(last=False)
+
+    def get(self, customer_id):
+        # The full customer record, or None; the customer becomes recently used
+        customer_id = customer_id.strip()
+        if not customer_id:
+            return None
+        with self._lock:
+            customer = self.recent.get(customer_id)
+            if customer is None:
+                row = self.conn.execute(
+                    "SELECT customer_id, name, phone, address FROM customers WHERE customer_id = ?",
+                    (customer_id,)).fetchone()
+                if row is None:
+                    return None
+                customer = dict(zip(CUSTOMER_FIELDS, row))
+            self._remember(customer)
+            return dict(customer)
+
+    def save(self, customer):
+        # Add or update a customer from a record with the CUSTOMER_FIELDS (a
+        # quotation will do). Customers without an ID are not kept, and a blank
+        # field does not erase what is on file. Returns the stored record.
+        values = customer_values(customer)
+        if not values[0]:
+            return None
+        with self._lock:
+            with self.conn:
+                self.conn.execute(UPSERT_CUSTOMER, values)
+                row = self.conn.execute(
+                    "SELECT customer_id, name, phone, address FROM customers WHERE customer_id = ?",
+                    (values[0],)).fetchone()
+            customer = dict(zip(CUSTOMER_FIELDS, row))
+            if self.loaded:
+                self._index(customer)
+            else:
+                self._pending.append(customer)
+            self._remember(customer)
+            return dict(customer)
+
+    def search(self, text, limit=8):
+        # Customers whose name or ID has a word starting with each word typed,
+        # or, for a number, whose phone number starts or ends with it. Recently
+        # used customers come first, then the rest in key order. Suggestions
+        # carry the ID, name and phone; get() has the full record.
+        self.load_async()
+        key = search_key(text)
+        if not key:
+            return []
+        terms = sorted(key.split(), key=len, reverse=True)
+        digits = phone_digits(key)
+        if len(digits) < MIN_PHONE_DIGITS or any(ch.isalpha() for ch in key):
+            digits = ""
+
+        with self._lock:
+            matches = []
+            seen = set()
+            for customer in reversed(self.recent.values()):
+                if self._matches(customer["customer_id"], customer["customer_name"],
+                                 customer["customer_phone"], terms, digits):
+                    seen.add(customer["customer_id"])
+                    matches.append({field: customer[field] for field in CUSTOMER_FIELDS[:3]})
+                    if len(matches) >= limit:
+                        return matches
+            if not self.loaded:
+                return matches
+
+            candidates = [self.words.prefix(terms[0])]
+            if digits:
+                # Every number is indexed in local form, so that is the form
+                # searched, whichever way it was typed
+                candidates.append(self.numbers.prefix(national_digits(digits)))
+                candidates.append(self.tails.prefix(digits[::-1]))
+            for positions in candidates:
+                for position in positions:
+                    customer_id = self.ids[position]
+                    if customer_id in seen:
+                        continue
+                    if not self._matches(customer_id, self.names[position], self.phones[position],
+                                         terms, digits):
+                        continue
+                    seen.add(customer_id)
+                    matches.append({"customer_id": customer_id, "customer_name": self.names[position],
+                                    "customer_phone": self.phones[position]})
+                    if len(matches) >= limit:
+                        return matches
+            return matches
+
+    def _matches(self, customer_id, name, phone, terms, digits):
+        words, numbers, tails = index_keys(customer_id, name, phone)
+        if all(any(word.startswith(term) for word in words) for term in terms):
+            return True
+        if digits:
+            return (any(number.startswith(national_digits(digits)) for number in numbers)
+                    or any(tail.startswith(digits[::-1]) for tail in tails))
+        return False
@@ -0,0 +1,157 @@
+import json
+import os
+import queue
+import threading
+import time
+
+from settings import DRAFT_JOURNAL_PATH
+from sinks import atomic_writer
+
+_STOP = object()
+
+
+def empty_draft():
+    # "saved" is true while the form holds nothing that is not already saved
+    return {"fields": {}, "rows": [], "saved": False}
+
+
+def apply_entry(draft, entry):
+    # Journal entries, one JSON object per line:
+    #   {"op": "field", "name": ..., "value": ...}
+    #   {"op": "row", "index": i, "row": [description, quantity, unit_price]}
+    #   {"op": "truncate", "count": n}          item rows beyond n were removed
+    #   {"op": "snapshot", "fields": {...}, "rows": [...], "saved": false}
+    #                                           written by compaction and mark_saved
+    op = entry.get("op")
+    draft["saved"] = op == "snapshot" and entry.get("saved", False)
+    if op == "field":
+        draft["fields"][entry["name"]] = entry["value"]
+    elif op == "row":
+        rows = draft["rows"]
+        index = entry["index"]
+        if index >= len(rows):
+            rows.extend([None] * (index + 1 - len(rows)))
+        rows[index] = entry["row"]
+    elif op == "truncate":
+        del draft["rows"][entry["count"]:]
+    elif op == "snapshot":
+        draft["fields"] = dict(entry["fields"])
+        draft["rows"] = list(entry["rows"])
+
+
+class DraftJournal:
+    # Append-only journal of form edits. The GUI only puts small entries on a
+    # queue; a background thread writes them in batches, fsyncs, and rewrites
+    # the journal as a single snapshot once it has grown long.
+    def __init__(self, path=DRAFT_JOURNAL_PATH, flush_interval=0.5, compact_after=5000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.compact_after = compact_after
+        self.draft = empty_draft()
+        self.queue = queue.Queue()
+        self._entries = 0
+        self._file = None
+        self._thread = None
+
+    def load(self):
+        # Replay the journal; returns the draft, or None if there is none
+        draft = empty_draft()
+        entries = 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn write at the end of the journal; keep what came before
+                        break
+                    apply_entry(draft, entry)
+                    entries += 1
+        except OSError:
+            return None
+        self.draft = draft
+        self._entries = entries
+        # A form that was saved (or closed) and not edited since is not restored
+        return draft if entries and not draft["saved"] else None
+
+    def start(self, draft, saved=False):
+        # draft is the form as it stands when journaling begins; the journal
+        # is restarted from a snapshot of it. saved: the form holds no unsaved
+        # work (nothing was restored), so it is not worth restoring either.
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.draft = dict(draft, saved=saved)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def set_field(self, name, value):
+        self.queue.put({"op": "field", "name": name, "value": value})
+
+    def set_row(self, index, description, quantity, unit_price):
+        self.queue.put({"op": "row", "index": index, "row": [description, quantity, unit_price]})
+
+    def truncate_rows(self, count):
+        self.queue.put({"op": "truncate", "count": count})
+
+    def mark_saved(self, draft):
+        # draft (the form as it stands) has nothing unsaved: it was saved, or
+        # the window was closed. The journal is compacted down to it, and the
+        # next start restores it only if it is edited again before then.
+        self.queue.put({"op": "snapshot", "fields": draft["fields"], "rows": draft["rows"], "saved": True})
+
+    def close(self):
+        # Write out anything still queued
+        if self._thread is not None:
+            self.queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        try:
+            self._compact()
+        except OSError:
+            pass
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            # Gather whatever else arrives within flush_interval into one write
+            deadline = time.monotonic() + self.flush_interval
+            while batch[-1] is not _STOP:
+                try:
+                    batch.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            if batch[-1] is _STOP:
+                batch.pop()
+                stopping = True
+            try:
+                self._write(batch)
+            except OSError:
+                # Autosave is best effort; keep the GUI running
+                pass
+        self._file.close()
+
+    def _write(self, entries):
+        if not entries:
+            return
+        for entry in entries:
+            apply_entry(self.draft, entry)
+        self._file.write("".join(json.dumps(entry) + "\n" for entry in entries))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._entries += len(entries)
+        if self._entries >= self.compact_after or self.draft["saved"]:
+            self._compact()
+
+    def _compact(self):
+        # Replace the journal with one snapshot of the current draft
+        snapshot = {"op": "snapshot", "fields": self.draft["fields"], "rows": self.draft["rows"],
+                    "saved": self.draft["saved"]}
+        # Closed first: Windows cannot replace a file that is still open
+        self._file.close()
+        try:
+            with atomic_writer(self.path) as f:
+                f.write((json.dumps(snapshot) + "\n").encode("utf-8"))
+            self._entries = 1
+        finally:
+            self._file = open(self.path, "a", encoding="utf-8")
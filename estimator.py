@@ -0,0 +1,239 @@
+import csv
+import math
+from array import array
+
+from pricing import (div_round, div_round_array, format_quantity, line_amount, load_numpy, to_cents,
+                     to_milli)
+
+# Mild steel, grams per cm^3: a 1 mm^2 cross-section weighs 7.85 g per metre
+STEEL_DENSITY = 7.85
+
+SECTION_NAMES = {
+    "box": "MS Box",
+    "angle": "MS Angle",
+    "flat": "MS Flat",
+    "pipe": "MS Pipe",
+    "sheet": "MS Sheet",
+}
+
+# Default material rates in cents per kg, editable in the estimator
+DEFAULT_RATES = {
+    "box": 7800,
+    "angle": 6800,
+    "flat": 6800,
+    "pipe": 7800,
+    "sheet": 7200,
+}
+
+# Standard sizes in mm. Box: (width, depth, wall); angle: (leg, leg,
+# thickness); flat: (width, thickness); pipe: (outside diameter, wall).
+BOX_SIZES = [
+    (20, 20, 1.6), (25, 25, 1.6), (25, 25, 2.0), (32, 32, 2.0), (32, 32, 2.6),
+    (40, 40, 2.0), (40, 40, 2.6), (40, 40, 3.2), (50, 50, 2.6), (50, 50, 3.2),
+    (50, 50, 4.0), (60, 60, 3.2), (60, 60, 4.0), (72, 72, 3.2), (72, 72, 4.0),
+    (75, 75, 4.0), (100, 100, 4.0), (100, 100, 5.0),
+    (40, 20, 1.6), (40, 20, 2.0), (50, 25, 2.0), (60, 40, 2.6), (80, 40, 3.2),
+    (96, 48, 3.2), (100, 50, 4.0), (122, 61, 4.5),
+]
+ANGLE_SIZES = [
+    (25, 25, 3), (25, 25, 5), (30, 30, 3), (30, 30, 5), (35, 35, 5), (40, 40, 5),
+    (40, 40, 6), (45, 45, 5), (50, 50, 5), (50, 50, 6), (65, 65, 6), (65, 65, 8),
+    (75, 75, 6), (75, 75, 8), (90, 90, 8), (100, 100, 8), (100, 100, 10),
+]
+FLAT_SIZES = [
+    (20, 3), (20, 5), (25, 3), (25, 5), (25, 6), (32, 5), (32, 6), (40, 5), (40, 6),
+    (40, 8), (50, 5), (50, 6), (50, 8), (50, 10), (65, 8), (65, 10), (75, 8),
+    (75, 10), (100, 10), (100, 12),
+]
+PIPE_SIZES = [
+    (21.3, 2.0), (21.3, 2.6), (26.9, 2.3), (26.9, 2.6), (33.7, 2.6), (33.7, 3.2),
+    (42.4, 2.6), (42.4, 3.2), (48.3, 2.9), (48.3, 3.2), (60.3, 2.9), (60.3, 3.6),
+    (76.1, 3.2), (76.1, 3.6), (88.9, 3.2), (88.9, 4.0), (114.3, 3.6), (114.3, 4.5),
+]
+# Standard wire gauge -> sheet thickness in mm
+SHEET_GAUGES = [
+    (10, 3.25), (12, 2.64), (14, 2.03), (16, 1.63), (18, 1.22), (20, 0.91),
+    (22, 0.71), (24, 0.56),
+]
+
+
+def _mm(value):
+    return f"{value:g}"
+
+
+def _section_rows():
+    # (kind, size label, cross-section area in mm^2); sheets instead give
+    # their thickness, since they are priced by area
+    for width, depth, wall in BOX_SIZES:
+        # Nominal, ignoring the corner radii
+        yield "box", f"{width}x{depth}x{wall:.1f}", width * depth - (width - 2 * wall) * (depth - 2 * wall)
+    for leg, other_leg, thickness in ANGLE_SIZES:
+        yield "angle", f"{leg}x{other_leg}x{thickness}", thickness * (leg + other_leg - thickness)
+    for width, thickness in FLAT_SIZES:
+        yield "flat", f"{width}x{thickness}", width * thickness
+    for diameter, wall in PIPE_SIZES:
+        bore = diameter - 2 * wall
+        yield "pipe", f"{_mm(diameter)}x{wall:.1f}", math.pi / 4 * (diameter ** 2 - bore ** 2)
+    for gauge, thickness in SHEET_GAUGES:
+        yield "sheet", f"{gauge} SWG ({thickness:.2f} mm)", thickness * 1000
+
+
+class SectionTable:
+    # Every standard section in parallel columns, built once at import. A
+    # section's position indexes `grams`: its weight in grams per metre of
+    # length, or per square metre for sheets.
+    def __init__(self, rows):
+        self.kinds = []
+        self.sizes = []
+        self.grams = array('q')
+        self.positions = {}
+        self.sizes_by_kind = {kind: [] for kind in SECTION_NAMES}
+        for kind, size, area in rows:
+            self.positions[(kind, size)] = len(self.kinds)
+            self.kinds.append(kind)
+            self.sizes.append(size)
+            self.grams.append(round(area * STEEL_DENSITY))
+            self.sizes_by_kind[kind].append(size)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def position(self, kind, size):
+        try:
+            return self.positions[(kind, size)]
+        except KeyError:
+            raise ValueError(f"Unknown section: {kind} {size}")
+
+    def kg_per_unit(self, position):
+        return self.grams[position] / 1000
+
+
+SECTIONS = SectionTable(_section_rows())
+
+
+def piece_weight(position, length, width=0, count=1):
+    # Weight in grams of `count` pieces; lengths in mm. Sheets are length x width.
+    if SECTIONS.kinds[position] == "sheet":
+        return div_round(SECTIONS.grams[position] * length * width * count, 1000 * 1000)
+    return div_round(SECTIONS.grams[position] * length * count, 1000)
+
+
+def section_description(position, pieces, length, width=0):
+    kind = SECTIONS.kinds[position]
+    name = f"{SECTION_NAMES[kind]} {SECTIONS.sizes[position]}"
+    # Lengths are given to format_quantity in mm, i.e. thousandths of a metre
+    if kind == "sheet":
+        return f"{name} - {pieces} nos x {format_quantity(length)} x {format_quantity(width)} m"
+    return f"{name} - {pieces} nos x {format_quantity(length)} m"
+
+
+def estimate(kind, size, length, count=1, width=0, rate=None):
+    # One line of the estimator: `count` pieces of `length` (and `width` for
+    # sheets) metres. Returns an item row: quantity is the weight in kg (in
+    # thousandths, i.e. grams) and unit_price the rate per kg in cents.
+    position = SECTIONS.position(kind, size)
+    length_mm, width_mm = to_milli(length), to_milli(width)
+    count = int(count)
+    if length_mm <= 0 or count <= 0 or (kind == "sheet" and width_mm <= 0):
+        raise ValueError("Length, width and number of pieces must be positive")
+    weight = piece_weight(position, length_mm, width_mm, count)
+    # A blank rate means the section's default, not Rs 0.00
+    rate = DEFAULT_RATES[kind] if rate is None or not str(rate).strip() else to_cents(rate)
+    return {
+        "description": f"{section_description(position, count, length_mm, width_mm)} "
+                       f"({format_quantity(weight)} kg)",
+        "quantity": weight,
+        "unit_price": rate,
+        "amount": line_amount(weight, rate),
+    }
+
+
+def _parse_pieces(pieces):
+    # Cut list rows (dicts with section, size, length, quantity and, for
+    # sheets, width; lengths in metres) as flat columns
+    positions = array('q')
+    lengths = array('q')
+    widths = array('q')
+    counts = array('q')
+    for number, piece in enumerate(pieces, 1):
+        try:
+            position = SECTIONS.position(str(piece["section"]).strip().lower(), str(piece["size"]).strip())
+            length = to_milli(piece["length"])
+            width = to_milli(piece.get("width") or 0)
+            count = int(piece.get("quantity") or 1)
+        except (KeyError, ValueError) as e:
+            raise ValueError(f"Cut list row {number}: {e}")
+        if length <= 0 or count <= 0:
+            raise ValueError(f"Cut list row {number}: length and quantity must be positive")
+        if SECTIONS.kinds[position] == "sheet" and width <= 0:
+            raise ValueError(f"Cut list row {number}: sheets need a width")
+        positions.append(position)
+        lengths.append(length)
+        widths.append(width)
+        counts.append(count)
+    if not positions:
+        raise ValueError("The cut list is empty")
+    return positions, lengths, widths, counts
+
+
+def _section_totals_python(positions, lengths, widths, counts):
+    weights = [0] * len(SECTIONS)
+    pieces = [0] * len(SECTIONS)
+    for position, length, width, count in zip(positions, lengths, widths, counts):
+        weights[position] += piece_weight(position, length, width, count)
+        pieces[position] += count
+    return weights, pieces
+
+
+def _section_totals_numpy(np, positions, lengths, widths, counts):
+    positions = np.frombuffer(positions, dtype=np.int64)
+    lengths = np.frombuffer(lengths, dtype=np.int64)
+    widths = np.frombuffer(widths, dtype=np.int64)
+    counts = np.frombuffer(counts, dtype=np.int64)
+    grams = np.frombuffer(SECTIONS.grams, dtype=np.int64)
+    is_sheet = np.array([kind == "sheet" for kind in SECTIONS.kinds])[positions]
+
+    # grams/unit x length (mm) x width (mm, or 1000 for lengths) x count,
+    # then mm x mm -> m^2; every step stays in exact integers
+    area = lengths * np.where(is_sheet, widths, 1000) * counts
+    weights = div_round_array(grams[positions] * area, 1000 * 1000)
+
+    section_weights = np.zeros(len(SECTIONS), dtype=np.int64)
+    section_pieces = np.zeros(len(SECTIONS), dtype=np.int64)
+    np.add.at(section_weights, positions, weights)
+    np.add.at(section_pieces, positions, counts)
+    return section_weights.tolist(), section_pieces.tolist()
+
+
+def estimate_cut_list(pieces, rates=None):
+    # Price a whole cut list in one pass. Returns one item row per section
+    # used (total weight in grams as quantity, rate per kg as unit price), in
+    # table order, so thousands of pieces become a few quotation lines.
+    rates = dict(DEFAULT_RATES, **(rates or {}))
+    columns = _parse_pieces(pieces)
+    np = load_numpy()
+    if np is not None:
+        weights, counts = _section_totals_numpy(np, *columns)
+    else:
+        weights, counts = _section_totals_python(*columns)
+
+    rows = []
+    for position, weight in enumerate(weights):
+        if not counts[position]:
+            continue
+        kind = SECTIONS.kinds[position]
+        rate = rates[kind]
+        rows.append({
+            "description": f"{SECTION_NAMES[kind]} {SECTIONS.sizes[position]} - "
+                           f"{counts[position]} pcs ({format_quantity(weight)} kg)",
+            "quantity": weight,
+            "unit_price": rate,
+            "amount": line_amount(weight, rate),
+        })
+    return rows
+
+
+def load_cut_list(path):
+    # CSV with a header row: section, size, length (m), quantity[, width (m)]
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return list(csv.DictReader(f))
@@ -0,0 +1,134 @@
+import itertools
+import os
+import zipfile
+
+from reportlab.platypus import ActionFlowable, Flowable, PageBreak
+
+from pdf_cache import default_cache
+from quotation import quotation_filename
+from renderer import build_elements, new_document
+from sinks import atomic_writer
+
+
+class QuoteBookmark(ActionFlowable):
+    # Adds a top-level outline entry pointing at the current page
+    def __init__(self, key, title):
+        super().__init__()
+        self.key = key
+        self.title = title
+
+    def apply(self, doc):
+        doc.canv.bookmarkPage(self.key)
+        doc.canv.addOutlineEntry(self.title, self.key, level=0)
+        # Open the PDF with the bookmarks panel showing
+        doc.canv.showOutline()
+
+
+class QuotationFeed(Flowable):
+    # Pulls quotations from an iterator one at a time while the document is
+    # being built. Like StreamingItemTable it never fits, so the frame calls
+    # split(), which returns the next quote's flowables followed by the feed
+    # itself. Only the quote being laid out exists as flowables.
+    def __init__(self, quotations, report=None):
+        super().__init__()
+        self._quotations = iter(quotations)
+        self._next = next(self._quotations, None)
+        self._count = 0
+        self._report = report
+
+    @property
+    def empty(self):
+        return self._next is None
+
+    def wrap(self, availWidth, availHeight):
+        return availWidth, availHeight + 1
+
+    def split(self, availWidth, availHeight):
+        quotation = self._next
+        self._next = next(self._quotations, None)
+        self._count += 1
+        if self._report:
+            self._report(self._count, quotation)
+
+        # Starts with an action flowable, so the doc template queues every
+        # part instead of trying to fit the first one here
+        parts = [PageBreak()] if self._count > 1 else []
+        parts.append(QuoteBookmark(f"quote{self._count}", bookmark_title(quotation)))
+        parts.extend(build_elements(quotation))
+        if self._next is not None:
+            parts.append(self)
+        return parts
+
+    def draw(self):
+        pass
+
+
+def bookmark_title(quotation):
+    title = f"{quotation['quote_number']} ({quotation['issue_date']})"
+    if quotation["customer_name"]:
+        title += f" - {quotation['customer_name']}"
+    return title
+
+
+def _write_pdf(feed, file_path):
+    # Written to a temporary file and renamed into place when complete
+    with atomic_writer(file_path) as f:
+        doc = new_document(f, shared_forms=True)
+        doc.title = "Ajith Iron Works quotations"
+        doc.build([feed])
+
+
+def export_pdf(quotations, file_path, report=None, per_file=None):
+    # Merged PDF, each quote starting on a new page with a bookmark. ReportLab
+    # keeps the finished (compressed) pages in memory until a file is saved,
+    # so per_file caps the quotes per file. An export that fits in one file
+    # is written to file_path; a longer one is split into name-001.pdf,
+    # name-002.pdf, ... Returns the paths written.
+    quotations = iter(quotations)
+    base, ext = os.path.splitext(file_path)
+    paths = []
+    while True:
+        offset = len(paths) * (per_file or 0)
+        feed = QuotationFeed(itertools.islice(quotations, per_file or None),
+                             report and (lambda n, q, offset=offset: report(offset + n, q)))
+        if feed.empty:
+            break
+        if len(paths) == 1:
+            # A second file is needed, so the first one is numbered as well
+            paths[0] = f"{base}-001{ext}"
+            os.replace(file_path, paths[0])
+        path = f"{base}-{len(paths) + 1:03d}{ext}" if paths else file_path
+        _write_pdf(feed, path)
+        paths.append(path)
+    if not paths:
+        raise ValueError("No quotations to export")
+    return paths
+
+
+def export_zip(quotations, file_path, report=None):
+    # One PDF per quote, rendered through the PDF cache and copied into the
+    # archive as it goes, so memory use does not grow with the number of quotes
+    cache = default_cache()
+    count = 0
+    with atomic_writer(file_path) as f:
+        with zipfile.ZipFile(f, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for quotation in quotations:
+                count += 1
+                if report:
+                    report(count, quotation)
+                path, hit = cache.get_or_render(quotation)
+                archive.write(path, quotation_filename(quotation["quote_number"]))
+        if not count:
+            raise ValueError("No quotations to export")
+    return [file_path]
+
+
+def export_quotations(quotations, file_path, report=None, per_file=None):
+    # The format follows the file extension: .pdf or .zip
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == ".pdf":
+        return export_pdf(quotations, file_path, report, per_file)
+    elif ext == ".zip":
+        return export_zip(quotations, file_path, report)
+    else:
+        raise ValueError(f"Unsupported export format: {ext or file_path} (use .pdf or .zip)")
@@ -0,0 +1,135 @@
+import csv
+import io
+import itertools
+import os
+
+from pricing import QTY_SCALE, to_cents, to_milli
+
+# Accepted header names for each item column, compared lowercased with
+# spaces, dots and underscores removed
+COLUMN_ALIASES = {
+    "description": ("description", "desc", "item", "items", "particulars", "name"),
+    "quantity": ("quantity", "qty", "nos", "pcs"),
+    "unit_price": ("unitprice", "price", "rate", "unitrate", "priceperunit"),
+}
+# Problem rows remembered for the import report; later ones are only counted
+MAX_REPORTED_ERRORS = 20
+
+
+def _header_key(value):
+    return "".join(ch for ch in str(value or "").lower() if ch not in " ._-")
+
+
+def column_positions(header):
+    # Maps item columns to their position in a header row, or None when the
+    # row has no description column (it is then taken to be data)
+    keys = [_header_key(value) for value in header]
+    positions = {}
+    for column, aliases in COLUMN_ALIASES.items():
+        for position, key in enumerate(keys):
+            if key in aliases:
+                positions[column] = position
+                break
+    return positions if "description" in positions else None
+
+
+class ItemImport:
+    # Streams item lines out of a CSV or XLSX file:
+    #   read (raw cells) -> parse (columns) -> convert (exact money values)
+    #   -> batches of (description, quantity, unit_price) tuples
+    # Nothing holds more than one batch, and `fraction` tracks how much of the
+    # file has been read, for a progress bar. Without a header row the
+    # columns are taken as description, quantity, unit price. Rows that fail
+    # to convert are skipped and noted in `errors` as (line, message).
+    def __init__(self, path, batch_size=500):
+        self.path = path
+        self.batch_size = batch_size
+        self.fraction = 0.0
+        self.imported = 0
+        self.skipped = 0
+        self.errors = []
+
+    def read_rows(self):
+        ext = os.path.splitext(self.path)[1].lower()
+        if ext in (".xlsx", ".xlsm"):
+            return self._read_xlsx()
+        if ext in (".csv", ".txt"):
+            return self._read_csv()
+        raise ValueError(f"Unsupported file type: {ext or self.path} (use .csv or .xlsx)")
+
+    def _read_csv(self):
+        # Progress comes from the position in the underlying binary file
+        size = os.path.getsize(self.path) or 1
+        with open(self.path, "rb") as raw:
+            text = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+            for row in csv.reader(text):
+                self.fraction = min(raw.tell() / size, 1.0)
+                yield row
+        self.fraction = 1.0
+
+    def _read_xlsx(self):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError("Reading .xlsx files needs openpyxl (pip install openpyxl)")
+        # Read-only mode streams the sheet instead of loading it whole
+        workbook = load_workbook(self.path, read_only=True, data_only=True)
+        try:
+            sheet = workbook.active
+            total = sheet.max_row or 0
+            for number, row in enumerate(sheet.iter_rows(values_only=True), 1):
+                if total:
+                    self.fraction = min(number / total, 1.0)
+                yield ["" if value is None else value for value in row]
+        finally:
+            workbook.close()
+        self.fraction = 1.0
+
+    def parse(self, rows):
+        # Yields (line number, description, quantity, unit price) as read
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return
+        positions = column_positions(first)
+        if positions is None:
+            positions = {"description": 0, "quantity": 1, "unit_price": 2}
+            rows = itertools.chain([first], rows)
+            start = 1
+        else:
+            start = 2
+
+        description = positions["description"]
+        quantity = positions.get("quantity")
+        unit_price = positions.get("unit_price")
+        for line, row in enumerate(rows, start):
+            if not any(str(value).strip() for value in row):
+                continue
+            yield (line,
+                   str(row[description]).strip() if description < len(row) else "",
+                   row[quantity] if quantity is not None and quantity < len(row) else "",
+                   row[unit_price] if unit_price is not None and unit_price < len(row) else "")
+
+    def convert(self, records):
+        # Exact integer values (see pricing); a missing quantity means one
+        for line, description, quantity, unit_price in records:
+            try:
+                quantity = to_milli(quantity) if str(quantity).strip() else QTY_SCALE
+                unit_price = to_cents(unit_price)
+                if quantity < 0 or unit_price < 0:
+                    raise ValueError("negative quantity or price")
+            except ValueError as e:
+                self.skipped += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append((line, str(e)))
+                continue
+            self.imported += 1
+            yield description, quantity, unit_price
+
+    def batches(self):
+        items = self.convert(self.parse(self.read_rows()))
+        while True:
+            batch = list(itertools.islice(items, self.batch_size))
+            if not batch:
+                return
+            yield batch
@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from settings import RENDER_LOG_BACKUPS, RENDER_LOG_MAX_BYTES, RENDER_LOG_PATH
+
+
+class StageTimer:
+    # Accumulates wall time per named stage of one render
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def as_millis(self):
+        return {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+
+
+@contextmanager
+def file_lock(lock_path):
+    # Exclusive lock shared by every process on the machine, held for the block
+    with open(lock_path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+
+            f.seek(0)
+            # Retries for up to ten seconds before raising OSError
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class SharedRotatingFileHandler(logging.Handler):
+    # Size-rotated log that several processes (the GUI, batch runs, the
+    # rendering service) can write at once. RotatingFileHandler keeps its file
+    # open, so after another process rotates, it goes on writing to the
+    # renamed file (POSIX) or fails to rename a file still open elsewhere
+    # (Windows). Here each record is appended with the file opened just for
+    # that write, and writing and rotating both happen under a lock file.
+    # Renders are seconds apart, so the extra open per record costs nothing.
+    def __init__(self, path, max_bytes, backups):
+        super().__init__()
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lock_path = path + ".lock"
+
+    def emit(self, record):
+        try:
+            line = (self.format(record) + "\n").encode("utf-8")
+            with file_lock(self.lock_path):
+                try:
+                    size = os.path.getsize(self.path)
+                except OSError:
+                    size = 0
+                if size and size + len(line) > self.max_bytes:
+                    self._rotate()
+                with open(self.path, "ab") as f:
+                    f.write(line)
+        except Exception:
+            self.handleError(record)
+
+    def _rotate(self):
+        # render.jsonl -> render.jsonl.1 -> ... -> render.jsonl.<backups>
+        for number in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{number}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{number + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+_logger = None
+
+
+def render_logger():
+    # JSON-lines log of every render, rotated by size, shared by every
+    # process that renders (see SharedRotatingFileHandler)
+    global _logger
+    if _logger is None:
+        logger = logging.getLogger("ajith_iron_works.render")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        try:
+            os.makedirs(os.path.dirname(RENDER_LOG_PATH), exist_ok=True)
+            handler = SharedRotatingFileHandler(RENDER_LOG_PATH, RENDER_LOG_MAX_BYTES, RENDER_LOG_BACKUPS)
+        except OSError:
+            handler = logging.NullHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        _logger = logger
+    return _logger
+
+
+def log_render(quotation, stages, outcome="ok", output_bytes=None, cache_hit=False, error=None, **extra):
+    # stages: {stage name: milliseconds}, as returned by StageTimer.as_millis
+    record = {
+        "time": datetime.now().isoformat(timespec="milliseconds"),
+        "quote_number": quotation["quote_number"],
+        "item_count": len(quotation["items"]),
+        "outcome": outcome,
+        "cache_hit": cache_hit,
+        "output_bytes": output_bytes,
+        "total_ms": round(sum(stages.values()), 3),
+        "stages_ms": stages,
+    }
+    if error is not None:
+        record["error"] = str(error)
+    record.update(extra)
+    render_logger().info(json.dumps(record, sort_keys=True))
+    return record
+
+
+def profile_render(render, output_dir, name="render", top=25):
+    # Run render() once under cProfile and tracemalloc and write
+    # <name>.prof, <name>.tracemalloc and a readable <name>-report.txt
+    import cProfile
+    import pstats
+    import tracemalloc
+
+    os.makedirs(output_dir, exist_ok=True)
+    prof_path = os.path.join(output_dir, f"{name}.prof")
+    snapshot_path = os.path.join(output_dir, f"{name}.tracemalloc")
+    report_path = os.path.join(output_dir, f"{name}-report.txt")
+
+    profiler = cProfile.Profile()
+    tracemalloc.start(25)
+    start = time.perf_counter()
+    try:
+        profiler.enable()
+        try:
+            render()
+        finally:
+            profiler.disable()
+        elapsed = time.perf_counter() - start
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    profiler.dump_stats(prof_path)
+    snapshot.dump(snapshot_path)
+
+    with open(report_path, "w", encoding="utf-8") as f:
+        f.write(f"Wall time (profiled): {elapsed:.3f}s\n")
+        f.write(f"Peak traced memory: {peak / 1024:.0f} KB\n\n")
+        f.write(f"Top {top} functions by cumulative time\n")
+        pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(top)
+        f.write(f"\nTop {top} allocation sites still alive at the end of the render\n")
+        for stat in snapshot.statistics("lineno")[:top]:
+            f.write(f"{stat}\n")
+    return {"profile": prof_path, "snapshot": snapshot_path, "report": report_path,
+            "seconds": elapsed, "peak_kb": peak // 1024}
@@ -0,0 +1,87 @@
+from array import array
+
+from pricing import CENTS, QTY_SCALE, line_amount, to_decimal
+
+
+class ItemStore:
+    # Column-oriented store for quotation line items. Numbers live in flat
+    # integer arrays (quantities in thousandths, money in cents, see pricing)
+    # instead of per-row widgets so thousands of lines stay cheap and exact.
+    def __init__(self):
+        self.descriptions = []
+        self.quantities = array('q')
+        self.unit_prices = array('q')
+        self.amounts = array('q')
+        # Running sum of self.amounts, adjusted by delta on every change
+        self.subtotal = 0
+        # Optional callback: observer("row", index) after a row is added or
+        # changed, observer("truncate", count) after rows beyond count are removed
+        self.observer = None
+
+    def __len__(self):
+        return len(self.descriptions)
+
+    def append(self, description="", quantity=QTY_SCALE, unit_price=0):
+        self.descriptions.append(description)
+        self.quantities.append(quantity)
+        self.unit_prices.append(unit_price)
+        amount = line_amount(quantity, unit_price)
+        self.amounts.append(amount)
+        self._adjust(amount)
+        index = len(self.descriptions) - 1
+        self._notify("row", index)
+        return index
+
+    def pop(self):
+        self.descriptions.pop()
+        self.quantities.pop()
+        self.unit_prices.pop()
+        self._adjust(-self.amounts.pop())
+        self._notify("truncate", len(self.descriptions))
+
+    def update(self, index, description=None, quantity=None, unit_price=None):
+        if description is not None:
+            self.descriptions[index] = description
+        if quantity is not None:
+            self.quantities[index] = quantity
+        if unit_price is not None:
+            self.unit_prices[index] = unit_price
+        amount = line_amount(self.quantities[index], self.unit_prices[index])
+        self._adjust(amount - self.amounts[index])
+        self.amounts[index] = amount
+        self._notify("row", index)
+        return amount
+
+    def clear(self):
+        del self.descriptions[:]
+        del self.quantities[:]
+        del self.unit_prices[:]
+        del self.amounts[:]
+        self.subtotal = 0
+        self._notify("truncate", 0)
+
+    def _adjust(self, delta):
+        self.subtotal += delta
+
+    def _notify(self, change, index):
+        if self.observer is not None:
+            self.observer(change, index)
+
+    def reset(self, index):
+        self.update(index, "", QTY_SCALE, 0)
+
+    def row(self, index):
+        return {
+            "description": self.descriptions[index],
+            "quantity": self.quantities[index],
+            "unit_price": self.unit_prices[index],
+            "amount": self.amounts[index],
+        }
+
+    def to_items(self):
+        # Exact decimal values, ready for quotation.normalize_quotation
+        return [
+            {"description": desc, "quantity": to_decimal(qty, QTY_SCALE),
+             "unit_price": to_decimal(price, CENTS)}
+            for desc, qty, price in zip(self.descriptions, self.quantities, self.unit_prices)
+        ]
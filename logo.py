@@ -0,0 +1,94 @@
+import hashlib
+import os
+
+from settings import LOGO_CACHE_DIR
+from sinks import atomic_writer
+
+# Bump when the normalized output changes, so old cache entries are not reused
+LOGO_PIPELINE_VERSION = 1
+# The logo is drawn 50pt wide; 300px is about 430 dpi at that size
+PRINT_MAX_PIXELS = 300
+THUMBNAIL_SIZE = (100, 100)
+JPEG_QUALITY = 90
+
+_digests = {}
+
+
+def file_digest(path):
+    # sha256 of the file's contents, remembered per (path, size, mtime)
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    digest = _digests.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                sha.update(chunk)
+        digest = _digests[key] = sha.hexdigest()
+    return digest
+
+
+def _has_alpha(img):
+    return img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+
+
+def _open_scaled(path, size):
+    # Let the JPEG decoder downscale while decoding (much faster for photos)
+    from PIL import Image as PILImage
+
+    img = PILImage.open(path)
+    img.draft("RGB", size)
+    return img
+
+
+def _save_atomic(img, path, **params):
+    # A cache file can always be rebuilt, so it is not fsynced
+    with atomic_writer(path, fsync=False) as f:
+        img.save(f, **params)
+
+
+def _cached(path, kind, make, cache_dir):
+    # Returns the cache file for (contents of path, kind), creating it once
+    digest = file_digest(path)
+    prefix = os.path.join(cache_dir, f"{digest}-v{LOGO_PIPELINE_VERSION}-{kind}")
+    for ext in (".png", ".jpg"):
+        if os.path.exists(prefix + ext):
+            return prefix + ext
+    # Concurrent renders may both build it; each publishes with os.replace
+    os.makedirs(cache_dir, exist_ok=True)
+    return make(path, prefix)
+
+
+def _make_print_asset(path, prefix):
+    from PIL import Image as PILImage
+
+    img = _open_scaled(path, (PRINT_MAX_PIXELS, PRINT_MAX_PIXELS))
+    img.thumbnail((PRINT_MAX_PIXELS, PRINT_MAX_PIXELS), PILImage.LANCZOS)
+    # Transparent logos stay PNG; everything else becomes a JPEG
+    if _has_alpha(img):
+        out = prefix + ".png"
+        _save_atomic(img.convert("RGBA"), out, format="PNG", optimize=True)
+    else:
+        out = prefix + ".jpg"
+        _save_atomic(img.convert("RGB"), out, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    return out
+
+
+def _make_thumbnail(path, prefix):
+    from PIL import Image as PILImage
+
+    img = _open_scaled(path, THUMBNAIL_SIZE)
+    img = img.convert("RGBA" if _has_alpha(img) else "RGB")
+    out = prefix + ".png"
+    _save_atomic(img.resize(THUMBNAIL_SIZE, PILImage.LANCZOS), out, format="PNG")
+    return out
+
+
+def print_asset(path, cache_dir=LOGO_CACHE_DIR):
+    # Downscaled copy of the logo for embedding in PDFs
+    return _cached(path, "print", _make_print_asset, cache_dir)
+
+
+def thumbnail(path, cache_dir=LOGO_CACHE_DIR):
+    # 100x100 preview for the logo section of the form
+    return _cached(path, "thumb", _make_thumbnail, cache_dir)
@@ -1,22 +1,33 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from datetime import date, timedelta
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch, mm
+import argparse
 import os
-import tempfile
 import subprocess
-import uuid
-import io
+import queue
 import sys
-from PIL import Image as PILImage
-from PIL import ImageTk
+import threading
+import time
+from catalog import Catalog
+from customers import CUSTOMER_FIELDS, CustomerDirectory
+from drafts import DraftJournal
+from estimator import DEFAULT_RATES, SECTION_NAMES, SECTIONS, estimate, estimate_cut_list, load_cut_list
+from importer import ItemImport
+from instrumentation import StageTimer, log_render
+from items import ItemStore
+from preview import PreviewUnavailable, default_page_cache
+from pricing import QTY_SCALE, format_cents, format_quantity, format_rate, quote_totals, to_cents, to_rate
+from quotation import DEFAULT_TERMS, HEADER_FIELDS, normalize_quotation, quotation_filename
+from quote_numbers import QuoteNumberAllocator
+from settings import OUTPUT_DIR
+from store import QuotationStore
+from widgets import NAVIGATION_KEYS, AutocompletePopup, ItemGrid, PdfPreview, UpdateScheduler, set_entry_text
+
+# Form fields kept in the draft journal, besides the terms and the item rows
+DRAFT_FIELDS = HEADER_FIELDS + ["discount", "tax_rate"]
 
 class QuotationGenerator:
-    def __init__(self, root):
+    def __init__(self, root, store=None, drafts=None):
         self.root = root
         self.root.title("Ajith Iron Works - Advanced Quotation Generator")
         self.root.geometry("1000x700")
@@ -29,9 +40,15 @@ class QuotationGenerator:
         style.configure('TLabelframe.Label', font=('Arial', 10, 'bold'))
         style.configure('TButton', font=('Arial', 10, 'bold'))
         
+        # The form on the left; the PDF preview pane joins it on the right
+        # after the first quotation is generated
+        self.panes = ttk.PanedWindow(root, orient=tk.HORIZONTAL)
+        self.panes.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.preview = None
+        
         # Main frame with scrollbar
-        container = ttk.Frame(root)
-        container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        container = ttk.Frame(self.panes)
+        self.panes.add(container, weight=3)
         
         # Create a canvas with scrollbar
         self.canvas = tk.Canvas(container, bg="#f5f5f5")
@@ -49,6 +66,20 @@ class QuotationGenerator:
         self.canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
         
+        # Quotation database
+        self.store = store or QuotationStore()
+        
+        # Quote numbers for quotes generated without one, taken one at a time
+        # so an open window does not hold back a block of numbers
+        self.quote_numbers = QuoteNumberAllocator(self.store.path, block_size=1)
+        
+        # Product/price catalog for the description autocomplete (read on first use)
+        self.catalog = Catalog()
+        
+        # Saved customers, filled into the form from a Customer ID or a name or
+        # phone suggestion
+        self.customers = CustomerDirectory(self.store.path)
+        
         # Logo section
         self.logo_path = None
         self.create_logo_section(self.scrollable_frame)
@@ -68,9 +99,9 @@ class QuotationGenerator:
         button_frame = ttk.Frame(self.scrollable_frame)
         button_frame.pack(fill=tk.X, padx=10, pady=10)
         
-        generate_btn = ttk.Button(button_frame, text="Generate Quotation", 
-                                 command=self.generate_quotation)
-        generate_btn.pack(side=tk.LEFT, padx=5)
+        self.generate_btn = ttk.Button(button_frame, text="Generate Quotation", 
+                                      command=self.generate_quotation)
+        self.generate_btn.pack(side=tk.LEFT, padx=5)
         
         clear_btn = ttk.Button(button_frame, text="Clear Form", 
                               command=self.clear_form)
@@ -84,10 +115,62 @@ class QuotationGenerator:
                                    command=self.remove_item_row)
         remove_item_btn.pack(side=tk.LEFT, padx=5)
         
+        self.import_thread = None
+        self.import_btn = ttk.Button(button_frame, text="Import Items", 
+                                    command=self.import_items)
+        self.import_btn.pack(side=tk.LEFT, padx=5)
+        
+        self.estimator_window = None
+        estimator_btn = ttk.Button(button_frame, text="Steel Estimator", 
+                                  command=self.open_estimator)
+        estimator_btn.pack(side=tk.LEFT, padx=5)
+        
+        # Render progress
+        self.render_thread = None
+        # The number the render worker gave the quote, until it is saved or
+        # given back; whichever takes it first owns it
+        self.render_number = None
+        self.render_number_lock = threading.Lock()
+        self.cancel_btn = ttk.Button(button_frame, text="Cancel", 
+                                    command=self.cancel_render, state="disabled")
+        self.cancel_btn.pack(side=tk.RIGHT, padx=5)
+        
+        self.render_progress = ttk.Progressbar(button_frame, mode="determinate", length=150, maximum=100)
+        self.render_progress.pack(side=tk.RIGHT, padx=5)
+        
+        self.render_status = ttk.Label(button_frame, text="")
+        self.render_status.pack(side=tk.RIGHT, padx=5)
+        
+        # Saved quotations
+        self.create_search_section(self.scrollable_frame)
+        
         # Bind mouse wheel to canvas for scrolling
         self.canvas.bind_all("<MouseWheel>", self._on_mousewheel)
+        
+        # Crash-safe draft: restore the last session's form, then journal edits
+        self.drafts = drafts or DraftJournal()
+        draft = self.drafts.load()
+        if draft:
+            self.restore_draft(draft)
+        self.watch_form_edits()
+        self.drafts.start(self.form_draft(), saved=draft is None)
+        # The form as last saved; closing with anything else asks first
+        self.saved_draft = self.form_draft() if draft is None else None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # ReportLab and PIL are not needed to show the form; load them in the
+        # background once the window has been drawn
+        self.root.after_idle(
+            lambda: threading.Thread(target=prewarm_pdf_stack, daemon=True).start())
+        self.root.after_idle(self.customers.load_async)
     
     def _on_mousewheel(self, event):
+        # Tables and the preview scroll themselves
+        widget = str(event.widget)
+        if widget.startswith(str(self.item_grid.tree)) or widget.startswith(str(self.search_results)):
+            return
+        if self.preview is not None and widget.startswith(str(self.preview)):
+            return
         self.canvas.yview_scroll(int(-1*(event.delta/120)), "units")
     
     def create_logo_section(self, parent):
@@ -124,10 +207,14 @@ class QuotationGenerator:
             self.logo_path = file_path
             self.logo_label.config(text=os.path.basename(file_path))
             
-            # Display logo preview
+            # Display logo preview from the cached thumbnail, and normalize
+            # the print-size logo now rather than during the first render
             try:
-                img = PILImage.open(file_path)
-                img = img.resize((100, 100), PILImage.LANCZOS)
+                from PIL import Image as PILImage
+                from PIL import ImageTk
+                from logo import print_asset, thumbnail
+                img = PILImage.open(thumbnail(file_path))
+                print_asset(file_path)
                 photo_img = ImageTk.PhotoImage(img)
                 self.logo_preview.config(image=photo_img)
                 self.logo_preview.image = photo_img  # Keep a reference
@@ -215,26 +302,20 @@ class QuotationGenerator:
         self.customer_address = ttk.Entry(address_frame, width=40)
         self.customer_address.pack(side=tk.LEFT, padx=5)
         
+        self.bind_customer_lookup()
+        
         # Items frame
         items_frame = ttk.LabelFrame(parent, text="Item Details", padding="10")
         items_frame.pack(fill=tk.X, padx=10, pady=5)
         
-        # Column headers
-        headers_frame = ttk.Frame(items_frame)
-        headers_frame.pack(fill=tk.X, pady=5)
+        # Debounced refresh of the subtotal/total fields
+        self.summary_updates = UpdateScheduler(self.root, lambda keys: self.refresh_summary())
         
-        ttk.Label(headers_frame, text="No.", width=5).pack(side=tk.LEFT, padx=2)
-        ttk.Label(headers_frame, text="Description", width=40).pack(side=tk.LEFT, padx=2)
-        ttk.Label(headers_frame, text="Quantity", width=10).pack(side=tk.LEFT, padx=2)
-        ttk.Label(headers_frame, text="Unit Price (Rs)", width=15).pack(side=tk.LEFT, padx=2)
-        ttk.Label(headers_frame, text="Amount (Rs)", width=15).pack(side=tk.LEFT, padx=2)
-        
-        # Container for item rows
-        self.items_container = ttk.Frame(items_frame)
-        self.items_container.pack(fill=tk.X)
-        
-        # List to store item widgets
-        self.item_rows = []
+        # Virtualized item grid backed by a compact item store
+        self.items = ItemStore()
+        self.item_grid = ItemGrid(items_frame, self.items, on_change=self.on_item_change,
+                                  catalog=self.catalog)
+        self.item_grid.pack(fill=tk.X)
         
         # Add 10 initial item rows
         for i in range(10):
@@ -258,12 +339,14 @@ class QuotationGenerator:
         self.discount = ttk.Entry(summary_grid, width=20)
         self.discount.grid(row=1, column=1, sticky="w", pady=2, padx=5)
         self.discount.insert(0, "0.00")
+        self.discount.bind("<KeyRelease>", self.schedule_summary)
         
         # Tax rate
         ttk.Label(summary_grid, text="Tax Rate (%):").grid(row=2, column=0, sticky="e", pady=2)
         self.tax_rate = ttk.Entry(summary_grid, width=20)
         self.tax_rate.grid(row=2, column=1, sticky="w", pady=2, padx=5)
         self.tax_rate.insert(0, "0.00")
+        self.tax_rate.bind("<KeyRelease>", self.schedule_summary)
         
         # Calculate button
         calculate_btn = ttk.Button(summary_grid, text="Calculate Total", 
@@ -282,103 +365,274 @@ class QuotationGenerator:
         
         self.terms = tk.Text(terms_frame, width=80, height=5)
         self.terms.pack(fill=tk.X, pady=5)
-        self.terms.insert(tk.END, "1. The prices in this quotation are valid for the period mentioned above.\n2. 50% advance payment is required to commence the work.\n3. You should pay the remaining amount of the bill upon completion of the work.\n4. Any modifications to the design after approval may incur additional charges.\n5. Delivery timeline will be confirmed upon receipt of advance payment.")
+        self.terms.insert(tk.END, DEFAULT_TERMS)
+    
+    def bind_customer_lookup(self):
+        # Customer suggestions under the ID, name and phone fields; a known
+        # Customer ID fills in the rest when Return is pressed or the field is left
+        self.filled_customer_id = None
+        for entry in (self.customer_id, self.customer_name, self.customer_phone):
+            completer = AutocompletePopup(entry, self.customer_matches, self.fill_customer)
+            entry.bind("<KeyRelease>", lambda e, c=completer: self._on_customer_key(c, e))
+            entry.bind("<Down>", lambda e, c=completer: c.move(1))
+            entry.bind("<Up>", lambda e, c=completer: c.move(-1))
+            entry.bind("<Return>", lambda e, c=completer: self._on_customer_return(c, e.widget))
+            entry.bind("<Escape>", lambda e, c=completer: c.hide())
+            entry.bind("<FocusOut>", lambda e, c=completer: c.hide())
+        self.customer_id.bind("<FocusOut>", lambda e: self.lookup_customer_id(), add="+")
+    
+    def customer_matches(self, text):
+        return [(f"{c['customer_id']}  -  {c['customer_name']}  -  {c['customer_phone']}", c)
+                for c in self.customers.search(text)]
+    
+    def _on_customer_key(self, completer, event):
+        if event.keysym not in NAVIGATION_KEYS:
+            completer.show_matches(event.widget.get())
+    
+    def _on_customer_return(self, completer, entry):
+        if completer.active:
+            completer.accept()
+        elif entry is self.customer_id:
+            self.lookup_customer_id()
+        return "break"
+    
+    def lookup_customer_id(self):
+        # Only a changed ID fills the form, so edits made after it are kept
+        customer_id = self.customer_id.get().strip()
+        if not customer_id or customer_id == self.filled_customer_id:
+            return
+        customer = self.customers.get(customer_id)
+        if customer is not None:
+            self.fill_customer(customer)
+    
+    def fill_customer(self, customer):
+        customer = self.customers.get(customer["customer_id"]) or customer
+        for field in CUSTOMER_FIELDS:
+            set_entry_text(getattr(self, field), customer.get(field, ""))
+        self.filled_customer_id = customer["customer_id"]
     
     def add_item_row(self):
-        row_num = len(self.item_rows) + 1
-        row_frame = ttk.Frame(self.items_container)
-        row_frame.pack(fill=tk.X, pady=2)
-        
-        # Item number
-        item_num = ttk.Label(row_frame, text=f"{row_num}.", width=5)
-        item_num.pack(side=tk.LEFT, padx=2)
-        
-        # Description
-        description = ttk.Entry(row_frame, width=40)
-        description.pack(side=tk.LEFT, padx=2)
-        
-        # Quantity
-        quantity = ttk.Entry(row_frame, width=10)
-        quantity.pack(side=tk.LEFT, padx=2)
-        quantity.insert(0, "1")
-        
-        # Unit price
-        unit_price = ttk.Entry(row_frame, width=15)
-        unit_price.pack(side=tk.LEFT, padx=2)
-        unit_price.insert(0, "0.00")
-        
-        # Amount (auto-calculated)
-        amount = ttk.Entry(row_frame, width=15)
-        amount.pack(side=tk.LEFT, padx=2)
-        amount.insert(0, "0.00")
-        amount.config(state="readonly")
-        
-        # Bind calculation events
-        def calculate_row_amount(event=None):
-            try:
-                qty = float(quantity.get() or 0)
-                price = float(unit_price.get() or 0)
-                row_amount = qty * price
-                
-                # Update the amount field
-                amount.config(state="normal")
-                amount.delete(0, tk.END)
-                amount.insert(0, f"{row_amount:.2f}")
-                amount.config(state="readonly")
-            except ValueError:
-                pass
-        
-        quantity.bind("<KeyRelease>", calculate_row_amount)
-        unit_price.bind("<KeyRelease>", calculate_row_amount)
-        
-        # Store row widgets
-        row_data = {
-            "frame": row_frame,
-            "number": item_num,
-            "description": description,
-            "quantity": quantity,
-            "unit_price": unit_price,
-            "amount": amount
-        }
-        
-        self.item_rows.append(row_data)
+        return self.item_grid.append_row()
     
     def remove_item_row(self):
-        if len(self.item_rows) > 1:  # Keep at least one row
-            row_data = self.item_rows.pop()
-            row_data["frame"].destroy()
-            
-            # Renumber remaining rows
-            for i, row in enumerate(self.item_rows, 1):
-                row["number"].config(text=f"{i}.")
+        if len(self.items) > 1:  # Keep at least one row
+            self.item_grid.pop_row()
+    
+    def open_estimator(self):
+        # Weight and material cost of standard steel sections, added to the
+        # quote as item rows (quantity in kg, unit price per kg)
+        if self.estimator_window is not None and self.estimator_window.winfo_exists():
+            self.estimator_window.lift()
+            return
+        
+        window = self.estimator_window = tk.Toplevel(self.root)
+        window.title("Steel Estimator")
+        window.transient(self.root)
+        frame = ttk.Frame(window, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        
+        kinds = {name: kind for kind, name in SECTION_NAMES.items()}
+        ttk.Label(frame, text="Section:").grid(row=0, column=0, sticky="e", pady=2)
+        section = ttk.Combobox(frame, values=list(kinds), state="readonly", width=24)
+        section.grid(row=0, column=1, sticky="w", pady=2, padx=5)
+        
+        ttk.Label(frame, text="Size (mm):").grid(row=1, column=0, sticky="e", pady=2)
+        size = ttk.Combobox(frame, state="readonly", width=24)
+        size.grid(row=1, column=1, sticky="w", pady=2, padx=5)
+        
+        entries = {}
+        for row, (key, text, default) in enumerate((("length", "Length (m):", "6"),
+                                                    ("width", "Width (m):", "1.25"),
+                                                    ("count", "Pieces:", "1"),
+                                                    ("rate", "Rate (Rs/kg):", "")), 2):
+            ttk.Label(frame, text=text).grid(row=row, column=0, sticky="e", pady=2)
+            entry = entries[key] = ttk.Entry(frame, width=26)
+            entry.grid(row=row, column=1, sticky="w", pady=2, padx=5)
+            entry.insert(0, default)
+        
+        result = ttk.Label(frame, text="", font=("Arial", 10, "bold"))
+        result.grid(row=6, column=0, columnspan=2, pady=8)
+        
+        def current():
+            kind = kinds[section.get()]
+            return estimate(kind, size.get(), entries["length"].get(), entries["count"].get(),
+                            entries["width"].get() if kind == "sheet" else 0, entries["rate"].get())
+        
+        # The rate typed for each section, used again when the section is
+        # picked later and for the sections of a loaded cut list
+        rates = {kind: format_cents(rate) for kind, rate in DEFAULT_RATES.items()}
+        
+        def update(event=None):
+            rates[kinds[section.get()]] = entries["rate"].get()
+            try:
+                item = current()
+            except (ValueError, KeyError):
+                result.config(text="")
+                return
+            result.config(text=f"Weight: {format_quantity(item['quantity'])} kg    "
+                               f"Amount: Rs {format_cents(item['amount'], grouping=True)}")
+        
+        def select_section(event=None):
+            kind = kinds[section.get()]
+            size.config(values=SECTIONS.sizes_by_kind[kind])
+            size.current(0)
+            entries["width"].config(state="normal" if kind == "sheet" else "disabled")
+            set_entry_text(entries["rate"], rates[kind])
+            update()
+        
+        def add_to_quote():
+            try:
+                item = current()
+            except (ValueError, KeyError) as e:
+                messagebox.showerror("Estimator", f"Cannot estimate: {str(e)}", parent=window)
+                return
+            self.item_grid.add_rows([(item["description"], item["quantity"], item["unit_price"])])
+        
+        def load_cut_list_file():
+            file_path = filedialog.askopenfilename(
+                parent=window, title="Select Cut List",
+                filetypes=(("CSV files", "*.csv"), ("All files", "*.*")))
+            if not file_path:
+                return
+            try:
+                rows = estimate_cut_list(load_cut_list(file_path),
+                                         rates={kind: to_cents(rate) for kind, rate in rates.items()
+                                                if rate.strip()})
+            except (OSError, ValueError) as e:
+                messagebox.showerror("Estimator", f"Failed to price cut list: {str(e)}", parent=window)
+                return
+            self.item_grid.add_rows([(row["description"], row["quantity"], row["unit_price"]) for row in rows])
+            total = sum(row["amount"] for row in rows)
+            result.config(text=f"Added {len(rows)} lines from the cut list: Rs {format_cents(total, grouping=True)}")
+        
+        section.bind("<<ComboboxSelected>>", select_section)
+        size.bind("<<ComboboxSelected>>", update)
+        for entry in entries.values():
+            entry.bind("<KeyRelease>", update)
+        
+        buttons = ttk.Frame(frame)
+        buttons.grid(row=7, column=0, columnspan=2, pady=5)
+        ttk.Button(buttons, text="Add to Quote", command=add_to_quote).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="Load Cut List...", command=load_cut_list_file).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="Close", command=window.destroy).pack(side=tk.LEFT, padx=5)
+        
+        section.current(0)
+        select_section()
+    
+    def import_items(self):
+        # Stream item lines from a CSV or Excel sheet into the table
+        if self.render_thread is not None or self.import_thread is not None:
+            return
+        file_path = filedialog.askopenfilename(
+            title="Import Items",
+            filetypes=(("Spreadsheets", "*.csv *.xlsx"), ("CSV files", "*.csv"),
+                       ("Excel workbooks", "*.xlsx"), ("All files", "*.*"))
+        )
+        if not file_path:
+            return
+        
+        # Parsed and converted on a background thread; the Tk thread only
+        # adds finished batches. The bounded queue keeps the reader from
+        # running far ahead of the table.
+        self.item_grid.commit_edit()
+        self.import_cancel = threading.Event()
+        self.import_results = queue.Queue(maxsize=8)
+        self.import_thread = threading.Thread(
+            target=self._import_worker,
+            args=(ItemImport(file_path), self.import_cancel, self.import_results),
+            daemon=True)
+        self._set_importing(True)
+        self.import_thread.start()
+        self.root.after(50, self._poll_import)
+    
+    def _import_worker(self, item_import, cancel_event, results):
+        # Runs off the Tk thread: must not touch any widget
+        try:
+            for batch in item_import.batches():
+                if cancel_event.is_set():
+                    results.put(("cancelled", item_import))
+                    return
+                results.put(("batch", batch, item_import.fraction))
+            results.put(("done", item_import))
+        except Exception as e:
+            results.put(("error", item_import, e))
+    
+    def _poll_import(self):
+        # Apply batches for up to 50 ms at a time so the window keeps redrawing
+        deadline = time.perf_counter() + 0.05
+        try:
+            while time.perf_counter() < deadline:
+                message = self.import_results.get_nowait()
+                if message[0] == "batch":
+                    self.item_grid.add_rows(message[1])
+                    self.render_progress["value"] = message[2] * 100
+                    continue
+                self.import_thread = None
+                self._set_importing(False)
+                self._import_finished(*message)
+                return
+        except queue.Empty:
+            pass
+        self.root.after(20, self._poll_import)
+    
+    def _import_finished(self, outcome, item_import, error=None):
+        if outcome == "error":
+            messagebox.showerror("Error", f"Failed to import items: {str(error)}")
+            return
+        status = f"Imported {item_import.imported} items"
+        if outcome == "cancelled":
+            status += " (cancelled)"
+        self.render_status.config(text=status)
+        if item_import.skipped:
+            details = "\n".join(f"Line {line}: {message}" for line, message in item_import.errors)
+            messagebox.showwarning("Import Items", f"{item_import.skipped} rows were skipped:\n{details}")
+    
+    def _set_importing(self, importing):
+        self.render_progress["value"] = 0
+        if importing:
+            self.generate_btn.config(state="disabled")
+            self.import_btn.config(state="disabled")
+            self.cancel_btn.config(state="normal")
+            self.render_status.config(text="Importing items...")
+        else:
+            self.generate_btn.config(state="normal")
+            self.import_btn.config(state="normal")
+            self.cancel_btn.config(state="disabled")
+            self.render_status.config(text="")
+    
+    def on_item_change(self, rows):
+        # Row amounts changed (already coalesced by the item grid); the store
+        # has already adjusted its subtotal
+        self.refresh_summary()
+    
+    def schedule_summary(self, event=None):
+        # Discount/tax keystrokes are debounced like item edits
+        self.summary_updates.mark()
+    
+    def refresh_summary(self, event=None):
+        try:
+            self.update_summary()
+        except ValueError:
+            # Leave the total as it was while discount/tax are being typed
+            pass
+    
+    def update_summary(self):
+        # Uses the running subtotal maintained by the item store, so this is
+        # constant-time regardless of how many items the quote has
+        subtotal = self.items.subtotal
+        
+        # Calculate final total in exact cents
+        totals = quote_totals(subtotal, to_cents(self.discount.get()), to_rate(self.tax_rate.get()))
+        
+        # Update the subtotal and total fields, only if they changed
+        set_entry_text(self.subtotal, format_cents(subtotal))
+        set_entry_text(self.total, format_cents(totals["total"]))
     
     def calculate_total(self):
         try:
-            # Calculate subtotal from all item rows
-            subtotal = 0
-            for row in self.item_rows:
-                try:
-                    amount_str = row["amount"].get()
-                    if amount_str:
-                        subtotal += float(amount_str)
-                except ValueError:
-                    pass
-            
-            # Update subtotal field
-            self.subtotal.delete(0, tk.END)
-            self.subtotal.insert(0, f"{subtotal:.2f}")
-            
-            # Calculate final total
-            discount = float(self.discount.get() or 0)
-            tax_rate = float(self.tax_rate.get() or 0)
-            
-            net_amount = subtotal - discount
-            tax_amount = net_amount * (tax_rate / 100)
-            total = net_amount + tax_amount
-            
-            # Update total field
-            self.total.delete(0, tk.END)
-            self.total.insert(0, f"{total:.2f}")
+            self.item_grid.commit_edit()
+            self.item_grid.row_updates.flush()
+            self.update_summary()
         except Exception as e:
             messagebox.showerror("Calculation Error", f"Error calculating total: {str(e)}")
     
@@ -396,20 +650,10 @@ class QuotationGenerator:
         self.customer_name.delete(0, tk.END)
         self.customer_phone.delete(0, tk.END)
         self.customer_address.delete(0, tk.END)
+        self.filled_customer_id = None
         
         # Clear all item rows
-        for row_data in self.item_rows:
-            row_data["description"].delete(0, tk.END)
-            row_data["quantity"].delete(0, tk.END)
-            row_data["quantity"].insert(0, "1")
-            row_data["unit_price"].delete(0, tk.END)
-            row_data["unit_price"].insert(0, "0.00")
-            
-            # Reset amount
-            row_data["amount"].config(state="normal")
-            row_data["amount"].delete(0, tk.END)
-            row_data["amount"].insert(0, "0.00")
-            row_data["amount"].config(state="readonly")
+        self.item_grid.clear_values()
         
         # Reset summary fields
         self.subtotal.delete(0, tk.END)
@@ -423,270 +667,501 @@ class QuotationGenerator:
         
         # Reset terms
         self.terms.delete("1.0", tk.END)
-        self.terms.insert(tk.END, "1. The prices in this quotation are valid for the period mentioned above.\n2. 50% advance payment is required to commence the work.\n3. You should pay the remaining amount of the bill upon completion of the work.\n4. Any modifications to the design after approval may incur additional charges.\n5. Delivery timeline will be confirmed upon receipt of advance payment.")
+        self.terms.insert(tk.END, DEFAULT_TERMS)
+    
+    def create_search_section(self, parent):
+        search_frame = ttk.LabelFrame(parent, text="Saved Quotations", padding="10")
+        search_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        filters_frame = ttk.Frame(search_frame)
+        filters_frame.pack(fill=tk.X, pady=2)
+        
+        self.search_fields = {}
+        for key, text in (("quote_number", "Quote #:"), ("customer_id", "Customer ID:"),
+                          ("date_from", "From:"), ("date_to", "To:")):
+            ttk.Label(filters_frame, text=text).pack(side=tk.LEFT)
+            entry = ttk.Entry(filters_frame, width=14)
+            entry.pack(side=tk.LEFT, padx=5)
+            entry.bind("<Return>", lambda e: self.search_quotations())
+            self.search_fields[key] = entry
+        
+        search_btn = ttk.Button(filters_frame, text="Search", command=self.search_quotations)
+        search_btn.pack(side=tk.LEFT, padx=5)
+        
+        load_btn = ttk.Button(filters_frame, text="Load", command=self.load_selected_quotation)
+        load_btn.pack(side=tk.LEFT, padx=5)
+        
+        # Results
+        columns = ("quote_number", "issue_date", "valid_until", "customer_id", "customer_name", "total")
+        headings = ("Quote #", "Issue Date", "Valid Until", "Customer ID", "Customer Name", "Total (Rs)")
+        self.search_results = ttk.Treeview(search_frame, columns=columns, show="headings",
+                                           height=6, selectmode="browse")
+        for column, heading in zip(columns, headings):
+            self.search_results.heading(column, text=heading)
+            self.search_results.column(column, width=120, anchor="e" if column == "total" else "w")
+        self.search_results.pack(fill=tk.X, pady=5)
+        self.search_results.bind("<Double-1>", lambda e: self.load_selected_quotation())
+    
+    def search_quotations(self):
+        filters = {key: entry.get().strip() for key, entry in self.search_fields.items()}
+        try:
+            results = self.store.search(**filters)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to search quotations: {str(e)}")
+            return
+        
+        self.search_results.delete(*self.search_results.get_children())
+        for row in results:
+            self.search_results.insert("", "end", iid=row["quote_number"], values=(
+                row["quote_number"], row["issue_date"], row["valid_until"],
+                row["customer_id"], row["customer_name"], format_cents(row["total"], grouping=True)))
+    
+    def load_selected_quotation(self):
+        selection = self.search_results.selection()
+        if not selection:
+            return
+        quotation = self.store.get(selection[0])
+        if quotation is None:
+            messagebox.showerror("Error", f"Quotation {selection[0]} no longer exists")
+            return
+        self.load_quotation(quotation)
+        self.saved_draft = self.form_draft()
+    
+    def load_quotation(self, quotation):
+        # Fill the form from a normalized quotation record
+        for field in HEADER_FIELDS:
+            entry = getattr(self, field)
+            entry.delete(0, tk.END)
+            entry.insert(0, quotation[field])
+        # The quote's own customer details stand, even if the directory differs
+        self.filled_customer_id = quotation["customer_id"]
+        
+        rows = [(item["description"], item["quantity"], item["unit_price"])
+                for item in quotation["items"]]
+        # Keep the usual number of blank lines available for editing
+        rows += [("", QTY_SCALE, 0)] * max(0, 10 - len(rows))
+        self.item_grid.load_rows(rows)
+        
+        self.discount.delete(0, tk.END)
+        self.discount.insert(0, format_cents(quotation["discount"]))
+        self.tax_rate.delete(0, tk.END)
+        self.tax_rate.insert(0, format_rate(quotation["tax_rate"]))
+        self.terms.delete("1.0", tk.END)
+        self.terms.insert(tk.END, quotation["terms"])
+        self.update_summary()
+    
+    def has_unsaved_work(self):
+        # Edited since it was last saved, and holding something worth keeping
+        draft = self.form_draft()
+        if draft == self.saved_draft:
+            return False
+        fields = draft["fields"]
+        return (any(fields[name].strip() for name in CUSTOMER_FIELDS)
+                or any(row[0].strip() for row in draft["rows"]))
+    
+    def form_draft(self):
+        # The form's raw contents in the draft journal's format
+        fields = {name: getattr(self, name).get() for name in DRAFT_FIELDS}
+        fields["terms"] = self.terms.get("1.0", "end-1c")
+        rows = [[self.items.descriptions[i], self.items.quantities[i], self.items.unit_prices[i]]
+                for i in range(len(self.items))]
+        return {"fields": fields, "rows": rows}
+    
+    def restore_draft(self, draft):
+        fields = draft["fields"]
+        for name in DRAFT_FIELDS:
+            if name in fields:
+                set_entry_text(getattr(self, name), fields[name])
+        self.filled_customer_id = fields.get("customer_id")
+        if "terms" in fields:
+            self.terms.delete("1.0", tk.END)
+            self.terms.insert(tk.END, fields["terms"])
+        if draft["rows"]:
+            self.item_grid.load_rows([tuple(row) if row else ("", QTY_SCALE, 0) for row in draft["rows"]])
+        self.refresh_summary()
+    
+    def watch_form_edits(self):
+        # Every change to a field, however it is made (typing, pasting, Clear
+        # Form, loading a saved quote), becomes a journal entry
+        self.draft_vars = []
+        for name in DRAFT_FIELDS:
+            entry = getattr(self, name)
+            var = tk.StringVar(value=entry.get())
+            entry.configure(textvariable=var)
+            var.trace_add("write", lambda *args, name=name, var=var: self.drafts.set_field(name, var.get()))
+            self.draft_vars.append(var)
+        
+        self.terms.edit_modified(False)
+        self.terms.bind("<<Modified>>", self._on_terms_modified)
+        self.items.observer = self._on_items_changed
+    
+    def _on_terms_modified(self, event=None):
+        if self.terms.edit_modified():
+            self.drafts.set_field("terms", self.terms.get("1.0", "end-1c"))
+            self.terms.edit_modified(False)
+    
+    def _on_items_changed(self, change, index):
+        if change == "row":
+            self.drafts.set_row(index, self.items.descriptions[index],
+                                self.items.quantities[index], self.items.unit_prices[index])
+        else:
+            self.drafts.truncate_rows(index)
+    
+    def on_close(self):
+        # Unsaved work is kept for the next start, as after a crash, unless
+        # the user chooses to discard it
+        self.item_grid.commit_edit()
+        if self.has_unsaved_work():
+            keep = messagebox.askyesnocancel(
+                "Unsaved Quotation",
+                "This quotation has changes that have not been generated and saved.\n\n"
+                "Keep it to restore the next time the app starts?\n"
+                "Choose No to discard it.")
+            if keep is None:
+                return
+            if not keep:
+                self.drafts.mark_saved(self.form_draft())
+        else:
+            self.drafts.mark_saved(self.form_draft())
+        self.drafts.close()
+        if self.render_thread is not None:
+            # A render still running is never saved, so its number is issued again
+            self.cancel_event.set()
+            self._give_back_number(self._take_render_number())
+        self.quote_numbers.close()
+        self.customers.close()
+        self.root.destroy()
+    
+    def collect_quotation(self):
+        # Snapshot the form into a plain quotation record
+        self.item_grid.commit_edit()
+        items = self.items.to_items()
+        
+        return normalize_quotation({
+            "quote_number": self.quote_number.get(),
+            "issue_date": self.issue_date.get(),
+            "valid_until": self.valid_until.get(),
+            "customer_id": self.customer_id.get(),
+            "customer_name": self.customer_name.get(),
+            "customer_phone": self.customer_phone.get(),
+            "customer_address": self.customer_address.get(),
+            "items": items,
+            "discount": self.discount.get(),
+            "tax_rate": self.tax_rate.get(),
+            "terms": self.terms.get("1.0", tk.END).strip(),
+            "logo_path": self.logo_path,
+        })
     
     def generate_quotation(self):
+        # Only one render at a time, and not while items are being imported
+        if self.render_thread is not None or self.import_thread is not None:
+            return
+        
         try:
             # Calculate totals first
             self.calculate_total()
             
-            # Validate inputs
-            if not self.quote_number.get():
-                messagebox.showerror("Error", "Quote number is required")
-                return
-            
-            # Extract values for the PDF
-            subtotal = float(self.subtotal.get() or 0)
-            discount = float(self.discount.get() or 0)
-            tax_rate = float(self.tax_rate.get() or 0)
-            net_amount = subtotal - discount
-            tax_amount = net_amount * (tax_rate / 100)
-            total = net_amount + tax_amount
-            
-            # Create a unique filename
-            filename = f"Ajith_Iron_Works_Quotation_{self.quote_number.get()}_{uuid.uuid4().hex[:6]}.pdf"
-            file_path = os.path.join(os.path.expanduser("~"), "Documents", filename)
+            # Snapshot the form; the worker thread only sees this plain record
+            quotation = self.collect_quotation()
+            # The form as saved, to clear the draft journal once the save is done
+            self.render_draft = self.form_draft()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to generate quotation: {str(e)}")
+            return
+        
+        # Render on a background thread and poll for its results from the Tk
+        # event loop, so the window stays responsive during long renders
+        self.cancel_event = threading.Event()
+        self.render_results = queue.Queue()
+        self.render_thread = threading.Thread(
+            target=self._render_worker,
+            args=(quotation, self.cancel_event, self.render_results),
+            daemon=True)
+        self._set_rendering(True)
+        self.render_thread.start()
+        self.root.after(50, self._poll_render)
+    
+    def _render_worker(self, quotation, cancel_event, results):
+        # Runs off the Tk thread: must not touch any widget
+        timer = StageTimer()
+        try:
+            # Usually already imported by prewarm_pdf_stack
+            from pdf_cache import default_cache, quotation_digest
+            from renderer import RenderCancelled, build_quotation_pdf
+        except ImportError as e:
+            results.put(("error", quotation, timer, e))
+            return
+        
+        try:
+            if not quotation["quote_number"]:
+                # Numbered here rather than on the Tk thread, as leasing a
+                # number can wait on the database
+                with self.render_number_lock:
+                    self.render_number = self.quote_numbers.next_number()
+                    quotation = dict(quotation, quote_number=self.render_number)
+        except Exception as e:
+            results.put(("error", quotation, timer, e))
+            return
+        
+        def render(quotation, path):
+            return build_quotation_pdf(quotation, path, cancel_event=cancel_event, timer=timer,
+                                       progress=lambda fraction: results.put(("progress", fraction)))
+        
+        try:
+            # Name the file after the quotation's content hash, so generating
+            # the same quote twice does not produce duplicate PDFs
+            digest = quotation_digest(quotation)
+            filename = quotation_filename(quotation["quote_number"], digest[:8])
+            file_path = os.path.join(OUTPUT_DIR, filename)
             
             # Ensure directory exists
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
             
-            # Create the PDF
-            doc = SimpleDocTemplate(
-                file_path,
-                pagesize=A4,
-                rightMargin=72,
-                leftMargin=72,
-                topMargin=72,
-                bottomMargin=72
-            )
-            
-            styles = getSampleStyleSheet()
-            elements = []
+            # Build PDF, unless an identical quote was rendered before
+            cache_hit = True
+            if not os.path.exists(file_path):
+                cache_hit = default_cache().render_to(quotation, file_path, render=render, digest=digest)
+            results.put(("done", quotation, file_path, digest, timer, cache_hit))
+        except RenderCancelled:
+            self._give_back_number(self._take_render_number())
+            results.put(("cancelled", quotation, timer))
+        except Exception as e:
+            self._give_back_number(self._take_render_number())
+            results.put(("error", quotation, timer, e))
+    
+    def _take_render_number(self):
+        with self.render_number_lock:
+            number, self.render_number = self.render_number, None
+            return number
+    
+    def _give_back_number(self, number):
+        # An unused number is issued again; failing that it is only a gap
+        if not number:
+            return
+        try:
+            self.quote_numbers.return_number(number)
+        except Exception as e:
+            print(f"Error returning quote number {number}: {e}")
+    
+    def _poll_render(self):
+        try:
+            while True:
+                message = self.render_results.get_nowait()
+                if message[0] == "progress":
+                    self.render_progress["value"] = message[1] * 100
+                    continue
+                self.render_thread = None
+                self._set_rendering(False)
+                if message[0] == "done":
+                    self._render_finished(*message[1:])
+                elif message[0] == "cancelled":
+                    quotation, timer = message[1:]
+                    log_render(quotation, timer.as_millis(), outcome="cancelled", source="gui")
+                else:
+                    quotation, timer, error = message[1:]
+                    log_render(quotation, timer.as_millis(), outcome="error", error=error, source="gui")
+                    messagebox.showerror("Error", f"Failed to generate quotation: {str(error)}")
+                return
+        except queue.Empty:
+            self.root.after(50, self._poll_render)
+    
+    def _render_finished(self, quotation, file_path, digest, timer, cache_hit):
+        number = self._take_render_number()
+        try:
+            # Keep a searchable copy of the quotation, and its customer
+            self.store.save(quotation)
+        except Exception as e:
+            self._give_back_number(number)
+            messagebox.showerror("Error", f"Failed to save quotation: {str(e)}")
+            return
+        try:
+            self.customers.save(quotation)
+            # A quote numbered by the worker takes its number into the form,
+            # unless one has been typed in meanwhile
+            if number:
+                self.render_draft["fields"]["quote_number"] = number
+                if not self.quote_number.get().strip():
+                    set_entry_text(self.quote_number, number)
+            # Nothing left to restore after a restart, unless the form has been
+            # edited while the quotation was rendering
+            self.saved_draft = self.render_draft
+            if self.form_draft() == self.render_draft:
+                self.drafts.mark_saved(self.render_draft)
             
-            # Custom styles
-            title_style = ParagraphStyle(
-                'Title',
-                parent=styles['Heading1'],
-                fontSize=18,
-                alignment=1,
-                spaceAfter=6,
-            )
+            # Pages are rasterized in the background as they come into view
+            with timer.stage("preview"):
+                self.show_preview(file_path, digest)
             
-            subtitle_style = ParagraphStyle(
-                'Subtitle',
-                parent=styles['Normal'],
-                fontSize=14,
-                alignment=1,
-                spaceAfter=12,
-            )
+            log_render(quotation, timer.as_millis(), output_bytes=os.path.getsize(file_path),
+                       cache_hit=cache_hit, source="gui")
             
-            address_style = ParagraphStyle(
-                'Address',
-                parent=styles['Normal'],
-                fontSize=10,
-                alignment=1,
-                spaceAfter=0.1*inch,
-            )
+            messagebox.showinfo("Success", f"Quotation has been generated and saved as:\n{file_path}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to generate quotation: {str(e)}")
+    
+    def show_preview(self, file_path, digest):
+        # Show the PDF in the preview pane. Without PyMuPDF or poppler-utils
+        # to rasterize it, open it in the system PDF viewer instead.
+        if self.preview is None:
+            try:
+                cache = default_page_cache()
+            except PreviewUnavailable:
+                open_file(file_path)
+                return
             
-            section_title_style = ParagraphStyle(
-                'SectionTitle',
-                parent=styles['Heading3'],
-                fontSize=12,
-                spaceBefore=0.2*inch,
-                spaceAfter=0.1*inch,
-            )
+            self.preview_frame = ttk.LabelFrame(self.panes, text="Preview", padding="5")
+            preview_buttons = ttk.Frame(self.preview_frame)
+            preview_buttons.pack(fill=tk.X, pady=(0, 5))
             
-            # Create style for table cell paragraphs
-            table_cell_style = ParagraphStyle(
-                'TableCell',
-                parent=styles['Normal'],
-                fontSize=10,
-                leading=12
-            )
+            open_btn = ttk.Button(preview_buttons, text="Open in Viewer",
+                                  command=lambda: open_file(self.preview.pdf_path))
+            open_btn.pack(side=tk.LEFT, padx=5)
             
-            # Create header with logo and company info
-            header_data = []
+            close_btn = ttk.Button(preview_buttons, text="Close Preview",
+                                   command=lambda: self.panes.forget(self.preview_frame))
+            close_btn.pack(side=tk.RIGHT, padx=5)
             
-            # Add logo if available
-            if self.logo_path:
-                try:
-                    logo_img = Image(self.logo_path, width=50, height=50)
-                    header_data.append([logo_img, ""])
-                except Exception as e:
-                    print(f"Error loading logo: {e}")
-                    # Add title without logo
-                    header_data.append(["", ""])
+            self.preview = PdfPreview(self.preview_frame, cache)
+            self.preview.pack(fill=tk.BOTH, expand=True)
+        
+        if str(self.preview_frame) not in map(str, self.panes.panes()):
+            self.panes.add(self.preview_frame, weight=2)
+        self.preview.show(file_path, digest)
+    
+    def cancel_render(self):
+        # The Cancel button stops a render or an item import
+        if self.render_thread is not None:
+            self.cancel_event.set()
+            self.render_status.config(text="Cancelling...")
+        elif self.import_thread is not None:
+            self.import_cancel.set()
+            self.render_status.config(text="Cancelling...")
+    
+    def _set_rendering(self, rendering):
+        self.render_progress["value"] = 0
+        if rendering:
+            self.generate_btn.config(state="disabled")
+            self.cancel_btn.config(state="normal")
+            self.render_status.config(text="Generating quotation...")
+        else:
+            self.generate_btn.config(state="normal")
+            self.cancel_btn.config(state="disabled")
+            self.render_status.config(text="")
 
+def prewarm_pdf_stack():
+    # Import the PDF libraries and build the default styles ahead of the first
+    # "Generate Quotation". Failures are left for the real render to report.
+    try:
+        import pdf_cache
+        import renderer
+        from PIL import ImageTk
+        renderer.get_render_context()
+        pdf_cache.default_cache()
+        default_page_cache()
+    except Exception:
+        pass
 
-            else:
-                # Add empty cell for alignment
-                header_data.append(["", ""])
-            
-            # Company info
-            company_info = [
-                Paragraph("Ajith Iron Works", title_style),
-                Paragraph("QUOTATION", subtitle_style),
-                Paragraph("No, 167/4, Bogahalandhawatta, Brahakmanagama,<br/>Pannipitiya.10230", address_style),
-                Paragraph("Website: pending!...<br/>Phone: 0789926314<br/>Whatsapp: 0789926314", address_style)
-            ]
-            
-            header_data[0][1] = company_info
-            
-            # Create header table
-            header_table = Table(header_data, colWidths=[1.5*inch, 4*inch])
-            header_table.setStyle(TableStyle([ 
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ('ALIGN', (0, 0), (0, -1), 'CENTER'),
-                ('ALIGN', (1, 0), (1, -1), 'CENTER'),
-                ('LEFTPADDING', (0, 0), (-1, -1), 10),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 10),
-            ]))
-            
-            elements.append(header_table)
-            elements.append(Spacer(1, 0.2*inch))
-            
-            # Quote details table
-            data = [
-                ["ISSUE DATE", self.issue_date.get(), "QUOTE #", self.quote_number.get()],
-                ["VALID UNTIL", self.valid_until.get(), "CUSTOMER ID", self.customer_id.get()]
-            ]
-            
-            quote_table = Table(data, colWidths=[1.2*inch, 1.3*inch, 1.2*inch, 1.3*inch])
-            quote_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-                ('BACKGROUND', (2, 0), (2, -1), colors.lightgrey),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-                ('PADDING', (0, 0), (-1, -1), 6),
-            ]))
-            elements.append(quote_table)
-            elements.append(Spacer(1, 0.2*inch))
-            
-            # Customer details
-            elements.append(Paragraph("CUSTOMER DETAILS", section_title_style))
-            
-            customer_data = []
-            if self.customer_name.get():
-                customer_data.append(["Customer Name:", self.customer_name.get()])
-            if self.customer_phone.get():
-                customer_data.append(["Phone:", self.customer_phone.get()])
-            if self.customer_address.get():
-                customer_data.append(["Address:", self.customer_address.get()])
-                
-            if customer_data:
-                customer_table = Table(customer_data, colWidths=[1.5*inch, 3.5*inch])
-                customer_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-                    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-                    ('PADDING', (0, 0), (-1, -1), 6),
-                ]))
-                elements.append(customer_table)
-            else:
-                elements.append(Paragraph("No customer details provided", styles['Normal']))
-            
-            elements.append(Spacer(1, 0.2*inch))
-            
-            # Items table
-            elements.append(Paragraph("ITEM DETAILS", section_title_style))
-            
-            # Prepare item data for table with paragraphs for wrapping text
-            item_data = [["No.", "Description", "Qty", "Unit Price (Rs)", "Amount (Rs)"]]
-            
-            for i, row in enumerate(self.item_rows, 1):
-                desc = row["description"].get()
-                qty = row["quantity"].get()
-                unit_price = row["unit_price"].get()
-                amount = row["amount"].get()
-                
-                # Only include rows with a description
-                if desc.strip():
-                    # Use Paragraph objects to allow text wrapping
-                    desc_para = Paragraph(desc, table_cell_style)
-                    item_data.append([i, desc_para, qty, unit_price, amount])
-            
-            # If no items were added, add a placeholder row
-            if len(item_data) == 1:
-                item_data.append(["", "No items added", "", "", ""])
-            
-            # Create item table with dynamic row heights
-            col_widths = [0.4*inch, 3.0*inch, 0.6*inch, 1.0*inch, 1.0*inch]
-            item_table = Table(item_data, colWidths=col_widths)
-            item_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-                ('PADDING', (0, 0), (-1, -1), 6),
-                ('ALIGN', (0, 0), (0, -1), 'CENTER'),
-                ('ALIGN', (2, 0), (4, -1), 'RIGHT'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ]))
-            elements.append(item_table)
-            elements.append(Spacer(1, 0.1*inch))
-            
-            # Summary table
-            summary_data = [
-                ["", "", "Subtotal:", f"{subtotal:,.2f}"],
-                ["", "", "Discount:", f"{discount:,.2f}"],
-                ["", "", "Net Amount:", f"{net_amount:,.2f}"],
-                ["", "", f"Tax ({tax_rate}%):", f"{tax_amount:,.2f}"],
-                ["", "", "TOTAL:", f"{total:,.2f}"]
-            ]
-            
-            summary_table = Table(summary_data, colWidths=[3.0*inch, 1.0*inch, 1.0*inch, 1.0*inch])
-            summary_table.setStyle(TableStyle([
-                ('GRID', (2, 0), (3, -1), 0.5, colors.black),
-                ('BACKGROUND', (2, 0), (2, -1), colors.lightgrey),
-                ('BACKGROUND', (2, -1), (2, -1), colors.grey),
-                ('TEXTCOLOR', (2, -1), (3, -1), colors.red),
-                ('ALIGN', (2, 0), (3, -1), 'RIGHT'),
-                ('PADDING', (2, 0), (3, -1), 6),
-                ('FONTNAME', (2, -1), (3, -1), 'Helvetica-Bold'),
-            ]))
-            elements.append(summary_table)
-            elements.append(Spacer(1, 0.2*inch))
-            
-            # Terms and conditions
-            elements.append(Paragraph("TERMS AND CONDITIONS", section_title_style))
-            terms_text = self.terms.get("1.0", tk.END).strip()
-            
-            # Split terms into paragraphs
-            terms_paragraphs = terms_text.split('\n')
-            for term in terms_paragraphs:
-                if term.strip():
-                    elements.append(Paragraph(term, styles['Normal']))
-                    elements.append(Spacer(1, 0.05*inch))
-            
-            # Add signature section
-            elements.append(Spacer(1, 0.3*inch))
-            sig_data = [
-                ["_______________________", "", "_______________________"],
-                ["Authorized Signature", "", "Customer Signature"],
-                ["Date: ________________", "", "Date: ________________"]
-            ]
-            
-            sig_table = Table(sig_data, colWidths=[2.0*inch, 1.0*inch, 2.0*inch])
-            sig_table.setStyle(TableStyle([
-                ('ALIGN', (0, 0), (0, -1), 'CENTER'),
-                ('ALIGN', (2, 0), (2, -1), 'CENTER'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ]))
-            elements.append(sig_table)
-            
-            # Build PDF
-            doc.build(elements)
+
+def open_file(file_path):
+    if sys.platform.startswith('win'):
+        os.startfile(file_path)
+    elif sys.platform.startswith('darwin'):  # macOS
+        subprocess.Popen(['open', file_path])
+    else:  # Linux
+        subprocess.Popen(['xdg-open', file_path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ajith Iron Works quotation generator")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    batch_parser = subparsers.add_parser(
+        "batch", help="render quotations from a CSV or JSON-lines file without the GUI")
+    batch_parser.add_argument("input", help="CSV (one row per line item) or JSON-lines file of quotations")
+    batch_parser.add_argument("-o", "--output-dir", default=OUTPUT_DIR,
+                              help="directory for the generated PDFs (default: %(default)s)")
+    batch_parser.add_argument("-j", "--workers", type=int, default=None,
+                              help="number of worker processes (default: one per CPU core)")
+    batch_parser.add_argument("--save", action="store_true",
+                              help="also save the quotations to the quotation database")
+    batch_parser.add_argument("--profile", action="store_true",
+                              help="render only the first quotation, under cProfile and tracemalloc, "
+                                   "and write the profile and memory snapshot to the output directory")
+    
+    export_parser = subparsers.add_parser(
+        "export", help="export saved quotations to one merged PDF with bookmarks, or a ZIP of PDFs")
+    export_parser.add_argument("output", help="output file: .pdf (merged) or .zip")
+    export_parser.add_argument("--from", dest="date_from", help="first issue date (YYYY-MM-DD)")
+    export_parser.add_argument("--to", dest="date_to", help="last issue date (YYYY-MM-DD)")
+    export_parser.add_argument("--customer", dest="customer_id", help="only this customer ID")
+    export_parser.add_argument("--quote-prefix", dest="quote_number", help="quote numbers starting with this")
+    export_parser.add_argument("--per-file", type=int, default=1000,
+                               help="start a new merged PDF after this many quotes, "
+                                    "0 for a single file (default: %(default)s)")
+    
+    serve_parser = subparsers.add_parser(
+        "serve", help="render quotations over HTTP on this machine (POST JSON, get a PDF back)")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    serve_parser.add_argument("--port", type=int, default=8765, help="port to listen on (default: %(default)s)")
+    serve_parser.add_argument("-j", "--workers", type=int, default=None,
+                              help="render processes (default: one per CPU core)")
+    serve_parser.add_argument("--max-queue", type=int, default=32,
+                              help="requests allowed to wait for a worker before answering 503 "
+                                   "(default: %(default)s)")
+    
+    args = parser.parse_args(argv)
+    
+    if args.command == "batch":
+        from batch import load_quotations, profile_one, render_batch
+        
+        try:
+            quotations, failures = load_quotations(args.input)
+        except (OSError, ValueError) as e:
+            print(f"Batch failed: {e}", file=sys.stderr)
+            return 1
+        # Quotations that cannot be read fail on their own; the rest render
+        for where, error in failures:
+            print(f"FAILED  {args.input} {where}  {error}")
+        if args.profile:
+            if quotations:
+                profile_one(quotations[0], args.output_dir)
+            return 0
+        summary = render_batch(quotations, args.output_dir, workers=args.workers)
+        if args.save:
+            with QuotationStore() as store:
+                store.save_many(q for q in quotations if q["quote_number"])
+        return 1 if summary["failed"] or failures else 0
+    
+    if args.command == "serve":
+        from service import run
+        
+        run(args.host, args.port, workers=args.workers, max_queue=args.max_queue)
+        return 0
+    
+    if args.command == "export":
+        from export import export_quotations
+        
+        filters = {key: getattr(args, key) for key in ("date_from", "date_to", "customer_id", "quote_number")}
+        with QuotationStore() as store:
+            total = store.count(**filters)
             
-            # Open the PDF
-            if sys.platform.startswith('win'):
-                os.startfile(file_path)
-            elif sys.platform.startswith('darwin'):  # macOS
-                subprocess.run(['open', file_path])
-            else:  # Linux
-                subprocess.run(['xdg-open', file_path])
+            def report(count, quotation):
+                if count % 100 == 0 or count == total:
+                    print(f"Exported {count}/{total} quotations")
             
-            messagebox.showinfo("Success", f"Quotation has been generated and saved as:\n{file_path}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to generate quotation: {str(e)}")
-
-if __name__ == "__main__":
+            try:
+                paths = export_quotations(store.iter_quotations(**filters), args.output,
+                                          report=report, per_file=args.per_file)
+            except ValueError as e:
+                print(f"Export failed: {e}", file=sys.stderr)
+                return 1
+        for path in paths:
+            print(f"Wrote {path}")
+        return 0
+    
     root = tk.Tk()
     app = QuotationGenerator(root)
     root.mainloop()
+    return 0
 
+if __name__ == "__main__":
+    sys.exit(main())
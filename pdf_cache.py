@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+
+from renderer import build_quotation_pdf, template_fingerprint
+from settings import PDF_CACHE_DIR, PDF_CACHE_MAX_BYTES
+from sinks import atomic_writer, copy_file
+
+
+def quotation_digest(quotation):
+    # Hash of the normalized quotation plus the template/logo fingerprint.
+    # The logo is identified by its contents, not its path.
+    data = {key: value for key, value in quotation.items() if key != "logo_path"}
+    payload = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    sha = hashlib.sha256()
+    sha.update(template_fingerprint(quotation.get("logo_path")).encode("utf-8"))
+    sha.update(b"\0")
+    sha.update(payload.encode("utf-8"))
+    return sha.hexdigest()
+
+
+class PdfCache:
+    # Content-addressed store of rendered PDFs. A file's mtime records when it
+    # was last used, and the least recently used files are evicted once the
+    # cache grows beyond max_bytes.
+    def __init__(self, directory=PDF_CACHE_DIR, max_bytes=PDF_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        # Running size estimate, so the directory is only rescanned when the
+        # cache may be over budget (or every few puts, to see other processes)
+        self._size = None
+        self._puts_since_scan = 0
+
+    def path_for(self, digest):
+        return os.path.join(self.directory, f"{digest}.pdf")
+
+    def get(self, digest):
+        path = self.path_for(digest)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put(self, digest, render):
+        # render(stream) writes the PDF. It is published atomically, so a
+        # failed or concurrent render never leaves a partial entry behind; the
+        # cache can always be rebuilt, so it is not fsynced.
+        with atomic_writer(self.path_for(digest), fsync=False) as f:
+            render(f)
+            size = f.tell()
+
+        self._puts_since_scan += 1
+        if self._size is not None:
+            self._size += size
+        if self._size is None or self._size > self.max_bytes or self._puts_since_scan >= 64:
+            self.evict()
+        return self.path_for(digest)
+
+    def get_or_render(self, quotation, render=build_quotation_pdf, digest=None):
+        # Returns (path of the cached PDF, whether it was already cached)
+        digest = digest or quotation_digest(quotation)
+        path = self.get(digest)
+        if path is not None:
+            return path, True
+        return self.put(digest, lambda stream: render(quotation, stream)), False
+
+    def render_to(self, quotation, file_path, render=build_quotation_pdf, digest=None):
+        # Copies the cached PDF to file_path (atomically) and returns whether
+        # it was a cache hit
+        path, hit = self.get_or_render(quotation, render, digest)
+        copy_file(path, file_path)
+        return hit
+
+    def evict(self):
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".pdf"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        self._puts_since_scan = 0
+        self._size = total
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._size = total
+
+
+_default_cache = None
+
+
+def default_cache():
+    # One cache object per process; the directory itself is shared safely
+    # between processes because entries are published with os.replace
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = PdfCache()
+    return _default_cache
@@ -0,0 +1,140 @@
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+
+from settings import PREVIEW_CACHE_MAX_BYTES
+
+# Page sizes are remembered for this many recent documents
+SIZES_CACHE_ENTRIES = 64
+
+
+class PreviewUnavailable(Exception):
+    pass
+
+
+class MuPdfRasterizer:
+    # In-process rasterizing with PyMuPDF (pip install pymupdf)
+    name = "PyMuPDF"
+
+    def __init__(self):
+        try:
+            import fitz
+        except ImportError:
+            raise PreviewUnavailable("PyMuPDF is not installed")
+        self.fitz = fitz
+
+    def page_sizes(self, pdf_path):
+        # [(width, height)] in points
+        with self.fitz.open(pdf_path) as doc:
+            return [(page.rect.width, page.rect.height) for page in doc]
+
+    def render_page(self, pdf_path, index, dpi):
+        with self.fitz.open(pdf_path) as doc:
+            return doc[index].get_pixmap(dpi=dpi).tobytes("png")
+
+
+class PopplerRasterizer:
+    # pdfinfo/pdftoppm from poppler-utils, one short-lived process per page
+    name = "pdftoppm"
+
+    def __init__(self):
+        self.pdfinfo = shutil.which("pdfinfo")
+        self.pdftoppm = shutil.which("pdftoppm")
+        if not self.pdfinfo or not self.pdftoppm:
+            raise PreviewUnavailable("poppler-utils (pdftoppm) is not installed")
+
+    def page_sizes(self, pdf_path):
+        # Quotations use one page size throughout, so the first page's size
+        # stands for every page
+        info = subprocess.run([self.pdfinfo, pdf_path], capture_output=True, text=True, check=True).stdout
+        pages, size = 0, None
+        for line in info.splitlines():
+            name, _, value = line.partition(":")
+            if name == "Pages":
+                pages = int(value)
+            elif name == "Page size":
+                width, _, height = value.split()[:3]
+                size = (float(width), float(height))
+        if size is None:
+            raise ValueError(f"Could not read the page size of {pdf_path}")
+        return [size] * pages
+
+    def render_page(self, pdf_path, index, dpi):
+        # With -singlefile and no output root the PNG is written to stdout
+        page = str(index + 1)
+        return subprocess.run([self.pdftoppm, "-png", "-r", str(dpi), "-f", page, "-l", page,
+                               "-singlefile", pdf_path],
+                              capture_output=True, check=True).stdout
+
+
+def find_rasterizer():
+    # The first rasterizer that is installed; PreviewUnavailable if none is
+    errors = []
+    for rasterizer in (MuPdfRasterizer, PopplerRasterizer):
+        try:
+            return rasterizer()
+        except PreviewUnavailable as e:
+            errors.append(str(e))
+    raise PreviewUnavailable("No PDF rasterizer available: " + "; ".join(errors))
+
+
+class PageImageCache:
+    # Rasterized preview pages as PNG bytes, keyed on (content digest of the
+    # quotation, page index, dpi). A digest always names the same PDF, so a
+    # page is rasterized once however often the quote is regenerated or
+    # scrolled past; the least recently used pages go once the cache holds
+    # more than max_bytes. Safe to use from several threads.
+    def __init__(self, rasterizer, max_bytes=PREVIEW_CACHE_MAX_BYTES):
+        self.rasterizer = rasterizer
+        self.max_bytes = max_bytes
+        self._pages = OrderedDict()
+        self._sizes = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def page_sizes(self, pdf_path, digest):
+        with self._lock:
+            sizes = self._sizes.get(digest)
+            if sizes is not None:
+                self._sizes.move_to_end(digest)
+                return sizes
+        sizes = self.rasterizer.page_sizes(pdf_path)
+        with self._lock:
+            self._sizes[digest] = sizes
+            if len(self._sizes) > SIZES_CACHE_ENTRIES:
+                self._sizes.popitem(last=False)
+        return sizes
+
+    def page(self, pdf_path, digest, index, dpi):
+        key = (digest, index, dpi)
+        with self._lock:
+            png = self._pages.get(key)
+            if png is not None:
+                self._pages.move_to_end(key)
+                return png
+        # Rasterize outside the lock; at worst two threads render the same page
+        png = self.rasterizer.render_page(pdf_path, index, dpi)
+        with self._lock:
+            if key not in self._pages:
+                self._pages[key] = png
+                self._bytes += len(png)
+                while self._bytes > self.max_bytes and len(self._pages) > 1:
+                    _, old = self._pages.popitem(last=False)
+                    self._bytes -= len(old)
+        return png
+
+    def __len__(self):
+        return len(self._pages)
+
+
+_default_cache = None
+
+
+def default_page_cache():
+    # Shared by every preview in the process; raises PreviewUnavailable when
+    # no rasterizer is installed
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = PageImageCache(find_rasterizer())
+    return _default_cache
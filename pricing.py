@@ -0,0 +1,176 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# NumPy is optional and slow to import, so it is only loaded by bulk_totals
+np = None
+_numpy_checked = False
+
+# Money is held as integer cents, quantities as integer thousandths of a unit
+# and tax rates as integer hundredths of a percent, so every total is exact
+CENTS = 100
+QTY_SCALE = 1000
+RATE_SCALE = 100
+# Largest accepted power of ten; anything bigger is a typo or an attack, and
+# an exponent like 1e999999999 would otherwise overflow the decimal context
+MAX_EXPONENT = 15
+
+
+def parse_decimal(value):
+    if isinstance(value, Decimal):
+        number = value
+    else:
+        if isinstance(value, float):
+            # str() gives the shortest repr, so 0.1 becomes Decimal("0.1")
+            value = str(value)
+        text = str(value).strip().replace(",", "") or "0"
+        try:
+            number = Decimal(text)
+        except InvalidOperation:
+            raise ValueError(f"could not convert string to number: {value!r}")
+    if not number.is_finite():
+        raise ValueError(f"could not convert string to number: {value!r}")
+    if number and number.adjusted() > MAX_EXPONENT:
+        raise ValueError(f"number too large: {value!r}")
+    return number
+
+
+def _scaled(value, scale):
+    try:
+        return int((parse_decimal(value) * scale).to_integral_value(rounding=ROUND_HALF_UP))
+    except ArithmeticError:
+        # decimal signals (Overflow, InvalidOperation) are ArithmeticErrors
+        raise ValueError(f"could not convert string to number: {value!r}")
+
+
+def to_cents(value):
+    return _scaled(value, CENTS)
+
+
+def to_milli(value):
+    return _scaled(value, QTY_SCALE)
+
+
+def to_rate(value):
+    return _scaled(value, RATE_SCALE)
+
+
+def div_round(numerator, denominator):
+    # Integer division rounding half away from zero, matching ROUND_HALF_UP
+    quotient = (abs(numerator) * 2 + denominator) // (2 * denominator)
+    return -quotient if numerator < 0 else quotient
+
+
+def line_amount(quantity, unit_price):
+    # quantity in thousandths x unit price in cents -> amount in cents
+    return div_round(quantity * unit_price, QTY_SCALE)
+
+
+def quote_totals(subtotal, discount, tax_rate):
+    net_amount = subtotal - discount
+    tax_amount = div_round(net_amount * tax_rate, 100 * RATE_SCALE)
+    return {
+        "subtotal": subtotal,
+        "discount": discount,
+        "tax_rate": tax_rate,
+        "net_amount": net_amount,
+        "tax_amount": tax_amount,
+        "total": net_amount + tax_amount,
+    }
+
+
+def to_decimal(value, scale):
+    return Decimal(value) / scale
+
+
+def format_cents(cents, grouping=False):
+    amount = to_decimal(cents, CENTS)
+    return f"{amount:,.2f}" if grouping else f"{amount:.2f}"
+
+
+def format_quantity(quantity):
+    # Drop trailing zeros: 2500 -> "2.5", 1000 -> "1"
+    text = f"{to_decimal(quantity, QTY_SCALE):f}"
+    return text.rstrip("0").rstrip(".") if "." in text else text
+
+
+def format_rate(tax_rate):
+    text = f"{to_decimal(tax_rate, RATE_SCALE):f}"
+    return text.rstrip("0").rstrip(".") if "." in text else text
+
+
+def _bulk_totals_python(offsets, quantities, unit_prices, discounts, tax_rates):
+    results = []
+    for n, (discount, tax_rate) in enumerate(zip(discounts, tax_rates)):
+        subtotal = sum(line_amount(quantities[i], unit_prices[i])
+                       for i in range(offsets[n], offsets[n + 1]))
+        results.append(quote_totals(subtotal, discount, tax_rate))
+    return results
+
+
+def div_round_array(numerator, denominator):
+    quotient = (np.abs(numerator) * 2 + denominator) // (2 * denominator)
+    return np.where(numerator < 0, -quotient, quotient)
+
+
+def _bulk_totals_numpy(offsets, quantities, unit_prices, discounts, tax_rates):
+    offsets = np.asarray(offsets, dtype=np.int64)
+    quantities = np.asarray(quantities, dtype=np.int64)
+    unit_prices = np.asarray(unit_prices, dtype=np.int64)
+    discounts = np.asarray(discounts, dtype=np.int64)
+    tax_rates = np.asarray(tax_rates, dtype=np.int64)
+
+    amounts = div_round_array(quantities * unit_prices, QTY_SCALE)
+    # Prefix sums turn per-quote subtotals into one subtraction per quote and
+    # stay exact in integer arithmetic, including quotes with no items
+    running = np.concatenate(([0], np.cumsum(amounts, dtype=np.int64)))
+    subtotals = running[offsets[1:]] - running[offsets[:-1]]
+    net_amounts = subtotals - discounts
+    tax_amounts = div_round_array(net_amounts * tax_rates, 100 * RATE_SCALE)
+    totals = net_amounts + tax_amounts
+    return [
+        {
+            "subtotal": int(subtotals[n]),
+            "discount": int(discounts[n]),
+            "tax_rate": int(tax_rates[n]),
+            "net_amount": int(net_amounts[n]),
+            "tax_amount": int(tax_amounts[n]),
+            "total": int(totals[n]),
+        }
+        for n in range(len(subtotals))
+    ]
+
+
+def flatten_quotations(quotations):
+    # Lay normalized quotations out as flat columns; the items of quotation n
+    # are quantities[offsets[n]:offsets[n + 1]]
+    offsets = [0]
+    quantities = []
+    unit_prices = []
+    discounts = []
+    tax_rates = []
+    for quotation in quotations:
+        for item in quotation["items"]:
+            quantities.append(item["quantity"])
+            unit_prices.append(item["unit_price"])
+        offsets.append(len(quantities))
+        discounts.append(quotation["discount"])
+        tax_rates.append(quotation["tax_rate"])
+    return offsets, quantities, unit_prices, discounts, tax_rates
+
+
+def load_numpy():
+    global np, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy as np
+        except ImportError:  # bulk totals fall back to plain Python
+            np = None
+        _numpy_checked = True
+    return np
+
+
+def bulk_totals(quotations):
+    # Total a whole batch of normalized quotations in one vectorized pass
+    columns = flatten_quotations(quotations)
+    if load_numpy() is not None:
+        return _bulk_totals_numpy(*columns)
+    return _bulk_totals_python(*columns)
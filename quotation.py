@@ -0,0 +1,66 @@
+from datetime import date, timedelta
+
+from pricing import line_amount, quote_totals, to_cents, to_milli, to_rate
+
+DEFAULT_TERMS = (
+    "1. The prices in this quotation are valid for the period mentioned above.\n"
+    "2. 50% advance payment is required to commence the work.\n"
+    "3. You should pay the remaining amount of the bill upon completion of the work.\n"
+    "4. Any modifications to the design after approval may incur additional charges.\n"
+    "5. Delivery timeline will be confirmed upon receipt of advance payment."
+)
+
+# Fields of a plain quotation record, in the order they appear on the form
+HEADER_FIELDS = [
+    "quote_number",
+    "issue_date",
+    "valid_until",
+    "customer_id",
+    "customer_name",
+    "customer_phone",
+    "customer_address",
+]
+
+
+def normalize_item(item):
+    return {
+        "description": str(item.get("description") or ""),
+        # Quantity in thousandths, unit price in cents (see pricing)
+        "quantity": to_milli(item.get("quantity", 1)),
+        "unit_price": to_cents(item.get("unit_price", 0)),
+    }
+
+
+def normalize_quotation(data):
+    # Build a complete quotation record from a (possibly partial) dict such as
+    # a JSON object, a CSV row group or a snapshot of the form
+    today = date.today()
+    quotation = {field: str(data.get(field) or "").strip() for field in HEADER_FIELDS}
+    if not quotation["issue_date"]:
+        quotation["issue_date"] = today.strftime("%Y-%m-%d")
+    if not quotation["valid_until"]:
+        quotation["valid_until"] = (today + timedelta(days=7)).strftime("%Y-%m-%d")
+
+    quotation["items"] = [normalize_item(item) for item in data.get("items") or []]
+    quotation["discount"] = to_cents(data.get("discount", 0))
+    quotation["tax_rate"] = to_rate(data.get("tax_rate", 0))
+    terms = data.get("terms")
+    quotation["terms"] = DEFAULT_TERMS if terms is None else str(terms)
+    quotation["logo_path"] = data.get("logo_path") or None
+    return quotation
+
+
+def item_amount(item):
+    return line_amount(item["quantity"], item["unit_price"])
+
+
+def compute_totals(quotation):
+    # All values are integer cents, apart from tax_rate (hundredths of a percent)
+    subtotal = sum(item_amount(item) for item in quotation["items"])
+    return quote_totals(subtotal, quotation["discount"], quotation["tax_rate"])
+
+
+def quotation_filename(quote_number, suffix=None):
+    if suffix:
+        return f"Ajith_Iron_Works_Quotation_{quote_number}_{suffix}.pdf"
+    return f"Ajith_Iron_Works_Quotation_{quote_number}.pdf"
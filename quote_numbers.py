@@ -0,0 +1,298 @@
+import atexit
+import os
+import re
+import socket
+import sqlite3
+import threading
+from datetime import date
+
+from settings import DATABASE_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quote_sequences (
+    prefix TEXT PRIMARY KEY,
+    next INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS quote_number_leases (
+    id INTEGER PRIMARY KEY,
+    prefix TEXT NOT NULL,
+    next INTEGER NOT NULL,
+    stop INTEGER NOT NULL,
+    host TEXT,
+    pid INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_quote_number_leases_prefix ON quote_number_leases (prefix, next);
+"""
+
+# Numbers leased to a process at a time
+DEFAULT_BLOCK_SIZE = 20
+# Digits after the prefix: Q2026-00042
+NUMBER_WIDTH = 5
+
+
+def default_prefix(today=None):
+    # Numbering starts again every year
+    return f"Q{(today or date.today()).year}-"
+
+
+def format_quote_number(prefix, number):
+    return f"{prefix}{number:0{NUMBER_WIDTH}d}"
+
+
+def pid_alive(pid):
+    if os.name == "nt":
+        import ctypes
+
+        # PROCESS_QUERY_LIMITED_INFORMATION; STILL_ACTIVE is 259
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            return False
+        try:
+            code = ctypes.c_ulong()
+            ctypes.windll.kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+            return code.value == 259
+        finally:
+            ctypes.windll.kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class QuoteNumberAllocator:
+    # Sequential quote numbers (Q2026-00001, Q2026-00002, ...) shared by
+    # every process using the quotation database. A process leases a block of
+    # block_size numbers in one short write transaction and issues numbers
+    # from it, so concurrent batch workers only meet on the shared database
+    # once per block. Each number issued is recorded in a small progress file
+    # of the lease (next to the database), not in the database, so issuing a
+    # number never waits for the database's write lock. The lease of a
+    # process that died is taken over, with its unissued numbers, by the
+    # next process on the machine that needs a block, and close() hands back
+    # what is left. Numbers are never issued twice and none are lost to
+    # crashes.
+    def __init__(self, path=DATABASE_PATH, block_size=DEFAULT_BLOCK_SIZE, prefix=None):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.progress_dir = path + ".leases"
+            os.makedirs(self.progress_dir, exist_ok=True)
+        else:
+            # A private database: progress is only kept in memory
+            self.progress_dir = None
+        self.block_size = block_size
+        self.prefix = prefix
+        # Autocommit: lease changes use explicit BEGIN IMMEDIATE transactions
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.host = socket.gethostname()
+        self.pid = os.getpid()
+        # [lease id, prefix, next number, stop] of the block being issued
+        self.lease = None
+        # Progress file of the lease being issued
+        self._progress = None
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            if self.conn is None:
+                return
+            self._release()
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def next_number(self, prefix=None):
+        prefix = prefix or self.prefix or default_prefix()
+        with self._lock:
+            while True:
+                if self.lease is None or self.lease[1] != prefix:
+                    self._acquire(prefix)
+                lease_id, _, number, stop = self.lease
+                if number + 1 < stop:
+                    self._record_progress(number + 1)
+                    self.lease[2] = number + 1
+                else:
+                    self.conn.execute("DELETE FROM quote_number_leases WHERE id = ?", (lease_id,))
+                    self._close_progress(remove=True)
+                    self.lease = None
+                # A number typed in by hand since the sequence started is
+                # passed over; issuing it would overwrite that quote on save
+                quote_number = format_quote_number(prefix, number)
+                if not self._in_use(quote_number):
+                    return quote_number
+
+    def _in_use(self, quote_number):
+        try:
+            return self.conn.execute("SELECT EXISTS (SELECT 1 FROM quotations WHERE quote_number = ?)",
+                                     (quote_number,)).fetchone()[0]
+        except sqlite3.OperationalError:
+            # No quotations table yet
+            return False
+
+    def return_number(self, quote_number):
+        # Hand back a number that was issued but not used, e.g. because its
+        # render failed, so it is issued again. The last number issued goes
+        # back onto this process's lease; any other becomes a one-number
+        # lease of its own for the next process that needs a block.
+        match = re.match(r"(.*?)(\d+)$", quote_number)
+        if match is None:
+            raise ValueError(f"Not a quote number: {quote_number!r}")
+        prefix, number = match.group(1), int(match.group(2))
+        with self._lock:
+            if self.lease is not None and self.lease[1] == prefix and self.lease[2] == number + 1:
+                self._record_progress(number)
+                self.lease[2] = number
+                return
+            self.conn.execute(
+                "INSERT INTO quote_number_leases (prefix, next, stop, host, pid) VALUES (?, ?, ?, NULL, NULL)",
+                (prefix, number, number + 1))
+
+    def _acquire(self, prefix):
+        self._release()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Lowest unfinished block first: one handed back, or one whose
+            # process on this machine has died
+            lease = None
+            # Progress files of dead processes, removed once committed
+            finished = []
+            for lease_id, start, stop, host, pid in self.conn.execute(
+                    "SELECT id, next, stop, host, pid FROM quote_number_leases "
+                    "WHERE prefix = ? ORDER BY next", (prefix,)):
+                if host is None or (host == self.host and pid != self.pid and not pid_alive(pid)):
+                    # A dead process may have issued numbers past the row's
+                    # `next`; its progress file has the last it recorded
+                    if host is not None:
+                        finished.append(self._progress_path(lease_id, host, pid))
+                        start = max(start, self._read_progress(finished[-1]))
+                    if start >= stop:
+                        self.conn.execute("DELETE FROM quote_number_leases WHERE id = ?", (lease_id,))
+                        continue
+                    lease = [lease_id, prefix, start, stop]
+                    self.conn.execute("UPDATE quote_number_leases SET host = ?, pid = ? WHERE id = ?",
+                                      (self.host, self.pid, lease_id))
+                    break
+            if lease is None:
+                start = self._sequence_next(prefix)
+                stop = start + self.block_size
+                self.conn.execute("INSERT OR REPLACE INTO quote_sequences (prefix, next) VALUES (?, ?)",
+                                  (prefix, stop))
+                cursor = self.conn.execute(
+                    "INSERT INTO quote_number_leases (prefix, next, stop, host, pid) VALUES (?, ?, ?, ?, ?)",
+                    (prefix, start, stop, self.host, self.pid))
+                lease = [cursor.lastrowid, prefix, start, stop]
+            # Written before the lease is committed, so its progress file
+            # never holds anything left from an earlier lease
+            self._open_progress(lease[0])
+            self._record_progress(lease[2])
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            self._close_progress()
+            raise
+        self.lease = lease
+        for path in finished:
+            self._remove_progress(path)
+
+    def _sequence_next(self, prefix):
+        row = self.conn.execute("SELECT next FROM quote_sequences WHERE prefix = ?", (prefix,)).fetchone()
+        if row is not None:
+            return row[0]
+        # A new sequence continues after any numbers with this prefix that
+        # were typed in by hand before numbering was automatic
+        pattern = re.compile(re.escape(prefix) + r"(\d+)$")
+        try:
+            like = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            rows = self.conn.execute("SELECT quote_number FROM quotations WHERE quote_number LIKE ? ESCAPE '\\'",
+                                     (like,))
+            numbers = [int(match.group(1)) for (quote_number,) in rows
+                       for match in [pattern.match(quote_number)] if match]
+        except sqlite3.OperationalError:
+            # No quotations table yet
+            numbers = []
+        return max(numbers, default=0) + 1
+
+    def _release(self):
+        # The progress goes back into the lease row, where the next process
+        # to lease the block finds it
+        if self.lease is None:
+            return
+        self.conn.execute("UPDATE quote_number_leases SET next = ?, host = NULL, pid = NULL WHERE id = ?",
+                          (self.lease[2], self.lease[0]))
+        self._close_progress(remove=True)
+        self.lease = None
+
+    def _progress_path(self, lease_id, host, pid):
+        # Named for the lease holder as well as the lease: SQLite reuses the
+        # id of a deleted lease, and a process finishing a block must not
+        # remove the file of the next process given the same id
+        if self.progress_dir is None:
+            return None
+        return os.path.join(self.progress_dir, f"{lease_id}-{host}-{pid}.next")
+
+    def _read_progress(self, path):
+        if path is None:
+            return 0
+        try:
+            with open(path, "rb") as f:
+                return int(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _open_progress(self, lease_id):
+        path = self._progress_path(lease_id, self.host, self.pid)
+        if path is not None:
+            self._progress = open(path, "wb")
+
+    def _record_progress(self, number):
+        # A fixed-width overwrite in a single write() call: a process that
+        # dies leaves either the old or the new number, never a mix. No fsync,
+        # as with the database's synchronous=NORMAL.
+        if self._progress is None:
+            return
+        self._progress.seek(0)
+        self._progress.write(f"{number:020d}".encode())
+        self._progress.flush()
+
+    def _close_progress(self, remove=False):
+        if self._progress is None:
+            return
+        self._progress.close()
+        if remove:
+            self._remove_progress(self._progress.name)
+        self._progress = None
+
+    def _remove_progress(self, path):
+        if path is None:
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+_default_allocator = None
+_default_lock = threading.Lock()
+
+
+def default_allocator():
+    # One allocator per process. Its lease is handed back at a normal exit;
+    # processes that end without running atexit handlers (pool workers) leave
+    # theirs to be taken over as dead.
+    global _default_allocator
+    with _default_lock:
+        if _default_allocator is None:
+            _default_allocator = QuoteNumberAllocator()
+            atexit.register(_default_allocator.close)
+        return _default_allocator
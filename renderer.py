@@ -0,0 +1,558 @@
+import copy
+import io
+import itertools
+import os
+import threading
+import time
+
+from reportlab import rl_config
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.pdfbase.pdfdoc import PDFArray, PDFBase85Encode, PDFName, PDFStream, PDFZCompress
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, Flowable
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+
+from instrumentation import StageTimer
+from logo import LOGO_PIPELINE_VERSION, file_digest, print_asset
+from pricing import format_cents, format_quantity, format_rate
+from quotation import compute_totals, item_amount
+from sinks import atomic_writer
+
+# Bump whenever the PDF layout changes so cached renders are not reused
+TEMPLATE_VERSION = 3
+
+
+class RenderCancelled(Exception):
+    pass
+
+
+def build_styles():
+    styles = getSampleStyleSheet()
+
+    # Custom styles
+    styles.add(ParagraphStyle(
+        'QuoteTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        alignment=1,
+        spaceAfter=6,
+    ))
+
+    styles.add(ParagraphStyle(
+        'QuoteSubtitle',
+        parent=styles['Normal'],
+        fontSize=14,
+        alignment=1,
+        spaceAfter=12,
+    ))
+
+    styles.add(ParagraphStyle(
+        'Address',
+        parent=styles['Normal'],
+        fontSize=10,
+        alignment=1,
+        spaceAfter=0.1*inch,
+    ))
+
+    styles.add(ParagraphStyle(
+        'SectionTitle',
+        parent=styles['Heading3'],
+        fontSize=12,
+        spaceBefore=0.2*inch,
+        spaceAfter=0.1*inch,
+    ))
+
+    # Style for table cell paragraphs
+    styles.add(ParagraphStyle(
+        'TableCell',
+        parent=styles['Normal'],
+        fontSize=10,
+        leading=12
+    ))
+    return styles
+
+
+def build_header(styles, logo_path=None):
+    # Create header with logo and company info
+    header_data = []
+
+    # Add logo if available
+    if logo_path:
+        try:
+            # Embed the downscaled print asset, not the original file. lazy=0
+            # keeps the decoded image on the flowable so cached headers don't
+            # decode the logo again for every document.
+            try:
+                asset_path = print_asset(logo_path)
+            except OSError as e:
+                print(f"Error normalizing logo: {e}")
+                asset_path = logo_path
+            logo_img = Image(asset_path, width=50, height=50, lazy=0)
+            header_data.append([logo_img, ""])
+        except Exception as e:
+            print(f"Error loading logo: {e}")
+            # Add title without logo
+            header_data.append(["", ""])
+    else:
+        # Add empty cell for alignment
+        header_data.append(["", ""])
+
+    # Company info
+    company_info = [
+        Paragraph("Ajith Iron Works", styles['QuoteTitle']),
+        Paragraph("QUOTATION", styles['QuoteSubtitle']),
+        Paragraph("No, 167/4, Bogahalandhawatta, Brahakmanagama,<br/>Pannipitiya.10230", styles['Address']),
+        Paragraph("Website: pending!...<br/>Phone: 0789926314<br/>Whatsapp: 0789926314", styles['Address'])
+    ]
+
+    header_data[0][1] = company_info
+
+    # Create header table
+    header_table = Table(header_data, colWidths=[1.5*inch, 4*inch])
+    header_table.setStyle(TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('ALIGN', (0, 0), (0, -1), 'CENTER'),
+        ('ALIGN', (1, 0), (1, -1), 'CENTER'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 10),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 10),
+    ]))
+    return header_table
+
+
+def build_table_styles():
+    return {
+        'quote': TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+            ('BACKGROUND', (2, 0), (2, -1), colors.lightgrey),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+            ('PADDING', (0, 0), (-1, -1), 6),
+        ]),
+        'customer': TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+            ('PADDING', (0, 0), (-1, -1), 6),
+        ]),
+        'items': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+            ('PADDING', (0, 0), (-1, -1), 6),
+            ('ALIGN', (0, 0), (0, -1), 'CENTER'),
+            ('ALIGN', (2, 0), (4, -1), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ]),
+        'summary': TableStyle([
+            ('GRID', (2, 0), (3, -1), 0.5, colors.black),
+            ('BACKGROUND', (2, 0), (2, -1), colors.lightgrey),
+            ('BACKGROUND', (2, -1), (2, -1), colors.grey),
+            ('TEXTCOLOR', (2, -1), (3, -1), colors.red),
+            ('ALIGN', (2, 0), (3, -1), 'RIGHT'),
+            ('PADDING', (2, 0), (3, -1), 6),
+            ('FONTNAME', (2, -1), (3, -1), 'Helvetica-Bold'),
+        ]),
+        'signature': TableStyle([
+            ('ALIGN', (0, 0), (0, -1), 'CENTER'),
+            ('ALIGN', (2, 0), (2, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ]),
+    }
+
+
+def build_signature(table_styles):
+    sig_data = [
+        ["_______________________", "", "_______________________"],
+        ["Authorized Signature", "", "Customer Signature"],
+        ["Date: ________________", "", "Date: ________________"]
+    ]
+
+    sig_table = Table(sig_data, colWidths=[2.0*inch, 1.0*inch, 2.0*inch])
+    sig_table.setStyle(table_styles['signature'])
+    return sig_table
+
+
+class StaticForm(Flowable):
+    # A flowable whose content never changes (the letterhead, the signature
+    # block). Its size is measured once per frame width instead of per
+    # document. In documents holding many quotes (new_document(...,
+    # shared_forms=True)) it is drawn once into a PDF form XObject, and every
+    # later quote only references the form. A single quote gains nothing from
+    # a form, which only adds its own objects to the file, so there it is
+    # drawn directly.
+    # Bleed around the measured size, so nothing drawn at the edge is clipped
+    BLEED = 6
+
+    def __init__(self, name, flowable):
+        super().__init__()
+        self.name = name
+        self.flowable = flowable
+        self.hAlign = getattr(flowable, 'hAlign', 'LEFT')
+        self._sizes = {}
+
+    def wrap(self, availWidth, availHeight):
+        size = self._sizes.get(availWidth)
+        if size is None:
+            size = self._sizes[availWidth] = self.flowable.wrap(availWidth, availHeight)
+        self.width, self.height = size
+        return size
+
+    def draw(self):
+        canv = self.canv
+        doc = getattr(canv, '_doctemplate', None)
+        if not getattr(doc, 'shared_forms', False):
+            self.flowable.drawOn(canv, 0, 0)
+            return
+        if not canv.hasForm(self.name):
+            canv.beginForm(self.name, lowerx=-self.BLEED, lowery=-self.BLEED,
+                           upperx=self.width + self.BLEED, uppery=self.height + self.BLEED)
+            self.flowable.drawOn(canv, 0, 0)
+            canv.endForm()
+        canv.doForm(self.name)
+
+    def placement(self):
+        # A copy to lay out in one document, sharing the measured sizes. The
+        # doc template marks a flowable it had to move to the next page
+        # (_postponed) and never clears the mark, so a shared instance would
+        # carry it into the next document, where "already moved once" makes
+        # the same move a LayoutError.
+        return copy.copy(self)
+
+
+# Names the form XObjects of each render context
+_form_numbers = itertools.count(1)
+
+# Render contexts keyed on (logo path, logo mtime). Style sheets, table styles
+# and the static header/signature flowables are identical for every quote, so
+# they are built once per process and reused until the logo file changes.
+_context_cache = {}
+_context_lock = threading.Lock()
+
+
+def _logo_key(logo_path):
+    if not logo_path:
+        return None, None
+    logo_path = os.path.abspath(logo_path)
+    try:
+        return logo_path, os.path.getmtime(logo_path)
+    except OSError:
+        return logo_path, None
+
+
+def get_render_context(logo_path=None, timer=None):
+    timer = timer or StageTimer()
+    key = _logo_key(logo_path)
+    with _context_lock:
+        context = _context_cache.get(key)
+        if context is None:
+            # Drop contexts built from an older version of the same logo
+            for stale in [k for k in _context_cache if k[0] == key[0]]:
+                del _context_cache[stale]
+
+            with timer.stage("style_setup"):
+                styles = build_styles()
+                table_styles = build_table_styles()
+                signature = build_signature(table_styles)
+            with timer.stage("logo_load"):
+                header = build_header(styles, logo_path)
+            number = next(_form_numbers)
+            header = StaticForm(f"Letterhead{number}", header)
+            signature = StaticForm(f"Signature{number}", signature)
+            context = {
+                'styles': styles,
+                'table_styles': table_styles,
+                'header': header,
+                'signature': signature,
+            }
+            _context_cache[key] = context
+        return context
+
+
+def template_fingerprint(logo_path=None):
+    # Identifies everything besides the quotation data that affects the PDF:
+    # the layout version and the logo file's contents
+    digest = ""
+    if logo_path:
+        try:
+            digest = f"{file_digest(logo_path)}:{LOGO_PIPELINE_VERSION}"
+        except OSError:
+            digest = "missing"
+    return f"v{TEMPLATE_VERSION}:{digest}"
+
+
+def clear_render_context_cache():
+    with _context_lock:
+        _context_cache.clear()
+
+
+ITEM_HEADER = ["No.", "Description", "Qty", "Unit Price (Rs)", "Amount (Rs)"]
+ITEM_COL_WIDTHS = [0.4*inch, 3.0*inch, 0.6*inch, 1.0*inch, 1.0*inch]
+
+# Quotes with more line items than this use StreamingItemTable
+LARGE_QUOTE_ITEMS = 500
+
+# Widest description drawn as a plain string: the column minus its padding
+PLAIN_DESCRIPTION_WIDTH = ITEM_COL_WIDTHS[1] - 12
+
+
+def description_cell(desc, style):
+    # Paragraphs wrap long text but are expensive to lay out; a description
+    # without markup that fits on one line is drawn as a plain string instead
+    if '<' not in desc and '&' not in desc and '\n' not in desc and \
+            stringWidth(desc, style.fontName, style.fontSize) <= PLAIN_DESCRIPTION_WIDTH:
+        return desc
+    return Paragraph(desc, style)
+
+
+def item_rows(items, styles):
+    cell_style = styles['TableCell']
+    for i, item in enumerate(items, 1):
+        desc = item["description"]
+
+        # Only include rows with a description
+        if desc.strip():
+            yield [i, description_cell(desc, cell_style), format_quantity(item['quantity']),
+                   format_cents(item['unit_price']), format_cents(item_amount(item))]
+
+
+class StreamingItemTable(Flowable):
+    # Item table for very large quotes. Instead of one giant Table that
+    # ReportLab has to split page by page, rows are pulled from a generator
+    # and each split emits a Table that fills the space left on the current
+    # page, with its own header row. Only about one page of rows exists as
+    # flowables at any time. The rows are formatted and laid out during
+    # doc.build; that time is added to the timer's "table_layout" stage.
+    CHUNK_ROWS = 40
+
+    def __init__(self, rows, table_style, timer=None):
+        super().__init__()
+        self._rows = rows
+        self._pending = []
+        self._table_style = table_style
+        self._timer = timer or StageTimer()
+        # Rows to lay out per attempt; tracks how many fitted on the last
+        # full page so little work is thrown away by the next split
+        self._chunk = self.CHUNK_ROWS
+
+    def _pull(self):
+        self._pending.extend(itertools.islice(self._rows, self._chunk - len(self._pending)))
+
+    def wrap(self, availWidth, availHeight):
+        # Always ask for more room than there is, so the frame calls split()
+        return availWidth, availHeight + 1
+
+    def split(self, availWidth, availHeight):
+        with self._timer.stage("table_layout"):
+            return self._split(availWidth, availHeight)
+
+    def _split(self, availWidth, availHeight):
+        self._pull()
+        table = Table([ITEM_HEADER] + self._pending, colWidths=ITEM_COL_WIDTHS, repeatRows=1)
+        table.setStyle(self._table_style)
+        self._pending = []
+        # This flowable is re-queued after every split, so clear the marker
+        # the doc template uses to detect flowables that never fit
+        self.__dict__.pop('_postponed', None)
+        w, h = table.wrap(availWidth, availHeight)
+        if h <= availHeight:
+            self._pull()
+            return [table, self] if self._pending else [table]
+
+        parts = table.split(availWidth, availHeight)
+        if not parts:
+            # Not even one row fits; put the rows back and go to the next page
+            self._pending = table._cellvalues[1:]
+            return []
+        # Rows that did not fit go back to the front of the queue
+        self._pending = parts[1]._cellvalues[1:]
+        self._chunk = max(self._chunk, len(parts[0]._cellvalues) + 2)
+        return [parts[0], self]
+
+    def draw(self):
+        pass
+
+
+def build_elements(quotation, timer=None):
+    timer = timer or StageTimer()
+    context = get_render_context(quotation.get("logo_path"), timer)
+    styles = context['styles']
+    section_title_style = styles['SectionTitle']
+    with timer.stage("totals"):
+        totals = compute_totals(quotation)
+    assembly_start = time.perf_counter()
+    elements = []
+
+    elements.append(context['header'].placement())
+    elements.append(Spacer(1, 0.2*inch))
+
+    # Quote details table
+    data = [
+        ["ISSUE DATE", quotation["issue_date"], "QUOTE #", quotation["quote_number"]],
+        ["VALID UNTIL", quotation["valid_until"], "CUSTOMER ID", quotation["customer_id"]]
+    ]
+
+    quote_table = Table(data, colWidths=[1.2*inch, 1.3*inch, 1.2*inch, 1.3*inch])
+    quote_table.setStyle(context['table_styles']['quote'])
+    elements.append(quote_table)
+    elements.append(Spacer(1, 0.2*inch))
+
+    # Customer details
+    elements.append(Paragraph("CUSTOMER DETAILS", section_title_style))
+
+    customer_data = []
+    if quotation["customer_name"]:
+        customer_data.append(["Customer Name:", quotation["customer_name"]])
+    if quotation["customer_phone"]:
+        customer_data.append(["Phone:", quotation["customer_phone"]])
+    if quotation["customer_address"]:
+        customer_data.append(["Address:", quotation["customer_address"]])
+
+    if customer_data:
+        customer_table = Table(customer_data, colWidths=[1.5*inch, 3.5*inch])
+        customer_table.setStyle(context['table_styles']['customer'])
+        elements.append(customer_table)
+    else:
+        elements.append(Paragraph("No customer details provided", styles['Normal']))
+
+    elements.append(Spacer(1, 0.2*inch))
+
+    # Items table
+    elements.append(Paragraph("ITEM DETAILS", section_title_style))
+
+    rows = item_rows(quotation["items"], styles)
+    first_row = next(rows, None)
+
+    if first_row is None:
+        # If no items were added, add a placeholder row
+        item_table = Table([ITEM_HEADER, ["", "No items added", "", "", ""]], colWidths=ITEM_COL_WIDTHS)
+        item_table.setStyle(context['table_styles']['items'])
+    elif len(quotation["items"]) > LARGE_QUOTE_ITEMS:
+        # Large quotes are laid out one page-sized table at a time
+        item_table = StreamingItemTable(itertools.chain([first_row], rows),
+                                        context['table_styles']['items'], timer)
+    else:
+        # Create item table with dynamic row heights
+        item_table = Table([ITEM_HEADER, first_row] + list(rows), colWidths=ITEM_COL_WIDTHS)
+        item_table.setStyle(context['table_styles']['items'])
+    elements.append(item_table)
+    elements.append(Spacer(1, 0.1*inch))
+
+    # Summary table
+    summary_data = [
+        ["", "", "Subtotal:", format_cents(totals['subtotal'], grouping=True)],
+        ["", "", "Discount:", format_cents(totals['discount'], grouping=True)],
+        ["", "", "Net Amount:", format_cents(totals['net_amount'], grouping=True)],
+        ["", "", f"Tax ({format_rate(totals['tax_rate'])}%):", format_cents(totals['tax_amount'], grouping=True)],
+        ["", "", "TOTAL:", format_cents(totals['total'], grouping=True)]
+    ]
+
+    summary_table = Table(summary_data, colWidths=[3.0*inch, 1.0*inch, 1.0*inch, 1.0*inch])
+    summary_table.setStyle(context['table_styles']['summary'])
+    elements.append(summary_table)
+    elements.append(Spacer(1, 0.2*inch))
+
+    # Terms and conditions
+    elements.append(Paragraph("TERMS AND CONDITIONS", section_title_style))
+
+    # Split terms into paragraphs
+    terms_paragraphs = quotation["terms"].strip().split('\n')
+    for term in terms_paragraphs:
+        if term.strip():
+            elements.append(Paragraph(term, styles['Normal']))
+            elements.append(Spacer(1, 0.05*inch))
+
+    # Add signature section
+    elements.append(Spacer(1, 0.3*inch))
+    elements.append(context['signature'].placement())
+    timer.add("table_assembly", time.perf_counter() - assembly_start)
+    return elements
+
+
+class CompactPageCanvas(Canvas):
+    # ReportLab keeps the content stream of every finished page as text until
+    # the document is saved, and only compresses it then. This canvas
+    # compresses each page as soon as it is finished, exactly as save() would,
+    # so a long document holds its pages at roughly their size in the output
+    # file instead of three to four times that. Memory still grows with the
+    # page count: ReportLab cannot write pages out before the end.
+    def showPage(self):
+        super().showPage()
+        page = self._doc.Pages.pages[-1]
+        if page.compression and page.stream and not page.Contents:
+            filters = [PDFBase85Encode, PDFZCompress] if rl_config.useA85 else [PDFZCompress]
+            content = page.stream
+            for stream_filter in reversed(filters):
+                content = stream_filter.encode(content)
+            # With Filter already set, the stream is written out as it is
+            contents = PDFStream(content=content)
+            contents.dictionary["Filter"] = PDFArray([PDFName(f.pdfname) for f in filters])
+            contents.__Comment__ = "page stream"
+            page.Contents = contents
+            page.stream = None
+
+
+class QuotationDocTemplate(SimpleDocTemplate):
+    def build(self, flowables, canvasmaker=CompactPageCanvas, **options):
+        super().build(flowables, canvasmaker=canvasmaker, **options)
+
+
+def new_document(output, shared_forms=False):
+    # output is a file path or a writable binary file object. shared_forms
+    # draws the static letterhead and signature once per document as form
+    # XObjects (see StaticForm); use it for documents holding many quotes.
+    doc = QuotationDocTemplate(
+        output,
+        pagesize=A4,
+        rightMargin=72,
+        leftMargin=72,
+        topMargin=72,
+        bottomMargin=72
+    )
+    doc.shared_forms = shared_forms
+    return doc
+
+
+def render_pdf(quotation, stream, progress=None, cancel_event=None, timer=None):
+    # Render a normalized quotation record as a PDF into any writable binary
+    # stream (an open file, io.BytesIO, ...) without touching the GUI.
+    # progress(fraction) is called as flowables are laid out, setting
+    # cancel_event aborts the build with RenderCancelled, and stage durations
+    # are added to timer (an instrumentation.StageTimer) when one is given.
+    timer = timer or StageTimer()
+    doc = new_document(stream)
+    if progress is not None or cancel_event is not None:
+        estimate = [1]
+
+        def on_progress(kind, value):
+            if cancel_event is not None and cancel_event.is_set():
+                raise RenderCancelled()
+            if kind == 'SIZE_EST':
+                estimate[0] = max(value, 1)
+            elif kind == 'PROGRESS' and progress is not None:
+                progress(min(value / estimate[0], 1.0))
+
+        doc.setProgressCallBack(on_progress)
+
+    elements = build_elements(quotation, timer)
+    if cancel_event is not None and cancel_event.is_set():
+        raise RenderCancelled()
+    with timer.stage("doc_build"):
+        doc.build(elements)
+    return stream
+
+
+def render_pdf_bytes(quotation, **options):
+    # The PDF as bytes, for callers that never need it on disk
+    buffer = io.BytesIO()
+    render_pdf(quotation, buffer, **options)
+    return buffer.getvalue()
+
+
+def build_quotation_pdf(quotation, output, **options):
+    # output is a writable binary stream or a file path. A path is written
+    # atomically: the PDF appears there complete or not at all.
+    if isinstance(output, (str, os.PathLike)):
+        with atomic_writer(output) as f:
+            render_pdf(quotation, f, **options)
+        return output
+    return render_pdf(quotation, output, **options)
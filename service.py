@@ -0,0 +1,315 @@
+import asyncio
+import json
+import os
+import re
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+
+from instrumentation import StageTimer, log_render
+from quotation import normalize_quotation, quotation_filename
+from quote_numbers import default_allocator
+
+# Requests carry quotation JSON; anything bigger than this is refused
+MAX_BODY_BYTES = 8 * 1024 * 1024
+MAX_HEADER_BYTES = 64 * 1024
+# Latencies kept for the /metrics percentiles
+LATENCY_WINDOW = 2048
+# Idle keep-alive connections are closed after this many seconds
+IDLE_TIMEOUT = 30.0
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           408: "Request Timeout", 413: "Payload Too Large", 500: "Internal Server Error",
+           503: "Service Unavailable", 504: "Gateway Timeout"}
+
+
+_CONTROL_CHARS = re.compile(r"[\x00-\x1f\x7f]")
+_UNSAFE_ASCII = re.compile(r'[^\x20-\x7e]|["\\]')
+
+
+class HttpError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def render_in_worker(quotation):
+    # Runs in a worker process. Returns (PDF bytes, stage timings in ms); the
+    # PDF is built in memory and never written to disk.
+    from renderer import render_pdf_bytes
+
+    timer = StageTimer()
+    pdf = render_pdf_bytes(quotation, timer=timer)
+    return pdf, timer.as_millis()
+
+
+def prewarm_worker():
+    # Import ReportLab and build the shared styles before the first request
+    from renderer import get_render_context
+
+    get_render_context()
+    return os.getpid()
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class QuotationService:
+    # Renders quotations over HTTP on localhost:
+    #   POST /quotations   quotation JSON in, application/pdf out
+    #   GET  /metrics      request counts, queue depth, latency percentiles
+    #   GET  /health
+    # At most `workers` renders run at once in a process pool. Up to
+    # `max_queue` more requests wait for a worker; beyond that requests are
+    # turned away at once with 503 and Retry-After rather than piling up.
+    def __init__(self, workers=None, max_queue=32, render_timeout=60.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.render_timeout = render_timeout
+        self.pool = None
+        self.slots = None
+        self.active = 0
+        self.waiting = 0
+        self.started = time.time()
+        self.statuses = Counter()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.render_times = deque(maxlen=LATENCY_WINDOW)
+
+    async def start(self, host="127.0.0.1", port=8765):
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.slots = asyncio.Semaphore(self.workers)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.pool, prewarm_worker)
+                               for _ in range(self.workers)))
+        return await asyncio.start_server(self.handle_connection, host, port,
+                                          limit=MAX_HEADER_BYTES)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                except HttpError as e:
+                    await self.respond(writer, e.status, error_body(e), close=True, headers=e.headers)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                start = time.perf_counter()
+                try:
+                    status, content_type, payload, extra = await self.dispatch(method, path, body)
+                except HttpError as e:
+                    status, content_type, payload, extra = e.status, "application/json", error_body(e), e.headers
+                except Exception as e:
+                    status, content_type, payload, extra = 500, "application/json", \
+                        error_body(HttpError(500, str(e))), {}
+                try:
+                    head = response_head(status, payload, content_type, extra, close=not keep_alive)
+                except ValueError as e:
+                    status, payload = 500, error_body(HttpError(500, f"Invalid response header: {e}"))
+                    head = response_head(status, payload, close=not keep_alive)
+                self.statuses[status] += 1
+                if path == "/quotations":
+                    self.latencies.append(time.perf_counter() - start)
+                writer.write(head + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, path, body):
+        path = path.split("?", 1)[0]
+        if path == "/quotations":
+            if method != "POST":
+                raise HttpError(405, "Use POST", {"Allow": "POST"})
+            return await self.render(body)
+        if path == "/metrics":
+            return 200, "application/json", json.dumps(self.metrics(), indent=2).encode(), {}
+        if path == "/health":
+            return 200, "application/json", b'{"status": "ok"}', {}
+        raise HttpError(404, f"No such endpoint: {path}")
+
+    async def render(self, body):
+        try:
+            quotation = normalize_quotation(json.loads(body))
+        except (ValueError, TypeError, AttributeError) as e:
+            raise HttpError(400, f"Invalid quotation: {e}")
+        # Callers send quotation data, not paths: a logo path would let any
+        # caller have the service open any image file on this machine
+        quotation["logo_path"] = None
+
+        # Backpressure: refuse rather than queue without bound
+        if self.active >= self.workers and self.waiting >= self.max_queue:
+            raise HttpError(503, "Render queue is full", {"Retry-After": "1"})
+
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        number = None
+        try:
+            if not quotation["quote_number"]:
+                # Numbered only once the render has a slot, so refused requests
+                # use up no numbers. Leasing a block waits on the database, so
+                # it runs off the event loop.
+                number = await loop.run_in_executor(None, lambda: default_allocator().next_number())
+                quotation["quote_number"] = number
+            job = self.pool.submit(render_in_worker, quotation)
+        except BaseException:
+            self._release_slot()
+            await self._return_number(number)
+            raise
+        # The slot is held until the worker is really done. A timeout only
+        # stops waiting: the worker process goes on rendering, and counting
+        # it as free would let the pool take on more jobs than `workers`.
+        job.add_done_callback(lambda job: loop.call_soon_threadsafe(self._release_slot))
+        try:
+            pdf, stages = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job)),
+                                                 self.render_timeout)
+        except asyncio.TimeoutError:
+            # Only succeeds if the job has not started yet
+            job.cancel()
+            await self._return_number(number)
+            raise HttpError(504, "Render timed out")
+        except BaseException:
+            await self._return_number(number)
+            raise
+        self.render_times.append(time.perf_counter() - start)
+        log_render(quotation, stages, output_bytes=len(pdf), source="service")
+
+        filename = quotation_filename(quotation["quote_number"])
+        return 200, "application/pdf", pdf, {"Content-Disposition": content_disposition(filename)}
+
+    def _release_slot(self):
+        self.active -= 1
+        self.slots.release()
+
+    async def _return_number(self, number):
+        # A failed render sends no PDF, so its number is issued again
+        if number:
+            await asyncio.get_running_loop().run_in_executor(None, default_allocator().return_number, number)
+
+    def metrics(self):
+        def summary(values):
+            ordered = sorted(values)
+            return {f"p{int(p * 100)}_ms": round(percentile(ordered, p) * 1000, 2) if ordered else None
+                    for p in (0.5, 0.9, 0.95, 0.99)}
+
+        return {
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "workers": self.workers,
+            "active_renders": self.active,
+            "queue_depth": self.waiting,
+            "max_queue": self.max_queue,
+            "responses": {str(status): count for status, count in sorted(self.statuses.items())},
+            "request_latency": summary(self.latencies),
+            "render_time": summary(self.render_times),
+            "latency_samples": len(self.latencies),
+        }
+
+    async def respond(self, writer, status, payload, content_type="application/json", headers=None,
+                      close=False):
+        writer.write(response_head(status, payload, content_type, headers, close) + payload)
+        await writer.drain()
+
+
+def response_head(status, payload, content_type="application/json", headers=None, close=False):
+    # Status line and headers; raises ValueError for a header value that
+    # would break out of its line or cannot be sent as Latin-1
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+             f"Content-Type: {content_type}",
+             f"Content-Length: {len(payload)}",
+             f"Connection: {'close' if close else 'keep-alive'}"]
+    for name, value in (headers or {}).items():
+        if _CONTROL_CHARS.search(f"{name}{value}"):
+            raise ValueError(f"control character in {name} header")
+        lines.append(f"{name}: {value}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def content_disposition(filename):
+    # Quote numbers come from the client: the plain filename keeps printable
+    # ASCII only, and filename* (RFC 5987) carries the full name
+    filename = _CONTROL_CHARS.sub("", filename)
+    fallback = _UNSAFE_ASCII.sub("_", filename)
+    return f"inline; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+
+def error_body(error):
+    return json.dumps({"error": str(error)}).encode()
+
+
+async def read_request(reader):
+    # Returns (method, path, headers, body), or None when the client closed
+    # the connection between requests
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial.strip():
+            return None
+        raise HttpError(400, "Incomplete request")
+    except asyncio.LimitOverrunError:
+        raise HttpError(413, "Request headers too large")
+
+    request_line, *header_lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, path, version = request_line.split(" ", 2)
+    except ValueError:
+        raise HttpError(400, "Malformed request line")
+    headers = {}
+    for line in header_lines:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HttpError(400, "Invalid Content-Length")
+    if length < 0:
+        raise HttpError(400, "Invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, f"Request body over {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, headers, body
+
+
+async def serve(host="127.0.0.1", port=8765, workers=None, max_queue=32):
+    service = QuotationService(workers=workers, max_queue=max_queue)
+    server = await service.start(host, port)
+    print(f"Serving quotations on http://{host}:{port} with {service.workers} workers "
+          f"(queue limit {max_queue}); Ctrl+C to stop")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def run(host="127.0.0.1", port=8765, workers=None, max_queue=32):
+    try:
+        asyncio.run(serve(host, port, workers, max_queue))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,36 @@
+import os
+
+# Generated quotations are saved alongside the user's documents
+OUTPUT_DIR = os.path.join(os.path.expanduser("~"), "Documents")
+
+# Application data (quotation database, caches, logs)
+DATA_DIR = os.path.join(os.path.expanduser("~"), ".ajith_iron_works")
+DATABASE_PATH = os.path.join(DATA_DIR, "quotations.db")
+
+# Rendered PDFs are cached by content so identical quotes are not rebuilt
+PDF_CACHE_DIR = os.path.join(DATA_DIR, "cache", "pdf")
+PDF_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Structured render timings (JSON lines, rotated)
+LOG_DIR = os.path.join(DATA_DIR, "logs")
+RENDER_LOG_PATH = os.path.join(LOG_DIR, "render.jsonl")
+RENDER_LOG_MAX_BYTES = 1024 * 1024
+RENDER_LOG_BACKUPS = 5
+
+# Product/price catalog: an editable CSV (sku, description, unit_price[, unit])
+# and the compiled search index rebuilt from it whenever it changes
+CATALOG_PATH = os.path.join(DATA_DIR, "catalog.csv")
+CATALOG_INDEX_PATH = os.path.join(DATA_DIR, "cache", "catalog.idx")
+
+# Normalized logos (print-resolution asset and preview thumbnail), by file hash
+LOGO_CACHE_DIR = os.path.join(DATA_DIR, "cache", "logo")
+
+# Journal of unsaved form edits, replayed on startup after a crash
+DRAFT_JOURNAL_PATH = os.path.join(DATA_DIR, "draft.jsonl")
+
+# Country calling code. Phone numbers saved in international form (+94 ...)
+# are also found by their local form (0...).
+COUNTRY_CODE = "94"
+
+# Rasterized pages shown in the in-window PDF preview (kept in memory)
+PREVIEW_CACHE_MAX_BYTES = 64 * 1024 * 1024
@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+# mkstemp creates files readable by the owner only; published files get the
+# usual permissions instead
+_umask = os.umask(0)
+os.umask(_umask)
+FILE_MODE = 0o666 & ~_umask
+
+
+@contextmanager
+def atomic_writer(file_path, fsync=True):
+    # Yields a binary file in the target's directory; on success it is synced
+    # and renamed over file_path, so readers never see a partial file. On
+    # error the temporary file is removed and file_path is left untouched.
+    directory = os.path.dirname(os.path.abspath(file_path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=directory)
+    try:
+        os.chmod(tmp_path, FILE_MODE)
+        with os.fdopen(fd, "wb") as f:
+            yield f
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_bytes(file_path, data):
+    with atomic_writer(file_path) as f:
+        f.write(data)
+    return file_path
+
+
+def copy_file(source_path, file_path):
+    with atomic_writer(file_path) as f, open(source_path, "rb") as source:
+        shutil.copyfileobj(source, f)
+    return file_path
@@ -0,0 +1,176 @@
+import os
+import sqlite3
+
+from customers import SCHEMA as CUSTOMER_SCHEMA, UPSERT_CUSTOMER, customer_values, seed_customers
+from quotation import HEADER_FIELDS, compute_totals
+from settings import DATABASE_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quotations (
+    id INTEGER PRIMARY KEY,
+    quote_number TEXT NOT NULL UNIQUE,
+    issue_date TEXT NOT NULL,
+    valid_until TEXT NOT NULL,
+    customer_id TEXT NOT NULL DEFAULT '',
+    customer_name TEXT NOT NULL DEFAULT '',
+    customer_phone TEXT NOT NULL DEFAULT '',
+    customer_address TEXT NOT NULL DEFAULT '',
+    discount INTEGER NOT NULL DEFAULT 0,
+    tax_rate INTEGER NOT NULL DEFAULT 0,
+    subtotal INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    terms TEXT NOT NULL DEFAULT '',
+    logo_path TEXT,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_quotations_customer_id ON quotations (customer_id, issue_date);
+CREATE INDEX IF NOT EXISTS idx_quotations_issue_date ON quotations (issue_date);
+CREATE INDEX IF NOT EXISTS idx_quotations_valid_until ON quotations (valid_until);
+
+CREATE TABLE IF NOT EXISTS quotation_items (
+    quotation_id INTEGER NOT NULL REFERENCES quotations (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    unit_price INTEGER NOT NULL,
+    PRIMARY KEY (quotation_id, position)
+) WITHOUT ROWID;
+"""
+
+# Money columns hold integer cents, quantity thousandths and tax_rate
+# hundredths of a percent, exactly as in the quotation record (see pricing)
+QUOTE_COLUMNS = HEADER_FIELDS + ["discount", "tax_rate", "subtotal", "total", "terms", "logo_path"]
+SUMMARY_COLUMNS = ["quote_number", "issue_date", "valid_until", "customer_id", "customer_name", "total"]
+
+
+class QuotationStore:
+    def __init__(self, path=DATABASE_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        # WAL lets readers (search panel, exports) run while a batch is writing
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        self.conn.executescript(CUSTOMER_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def save(self, quotation):
+        self.save_many([quotation])
+
+    def save_many(self, quotations, batch_size=500):
+        # Each batch is one transaction; re-saving a quote number replaces it
+        columns = ", ".join(QUOTE_COLUMNS)
+        placeholders = ", ".join("?" for _ in QUOTE_COLUMNS)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in QUOTE_COLUMNS if c != "quote_number")
+        upsert = (f"INSERT INTO quotations ({columns}) VALUES ({placeholders}) "
+                  f"ON CONFLICT (quote_number) DO UPDATE SET {updates}, "
+                  f"updated_at = CURRENT_TIMESTAMP")
+
+        batch = []
+        for quotation in quotations:
+            batch.append(quotation)
+            if len(batch) >= batch_size:
+                self._save_batch(upsert, batch)
+                batch = []
+        if batch:
+            self._save_batch(upsert, batch)
+
+    def _save_batch(self, upsert, quotations):
+        # Each quote's customer is saved with it, so quotes saved outside the
+        # GUI (batch --save) reach the customer directory too
+        with self.conn:
+            seed_customers(self.conn)
+            items = []
+            customers = []
+            for quotation in quotations:
+                totals = compute_totals(quotation)
+                row = dict(quotation, subtotal=totals["subtotal"], total=totals["total"])
+                self.conn.execute(upsert, [row[c] for c in QUOTE_COLUMNS])
+                quotation_id = self.conn.execute(
+                    "SELECT id FROM quotations WHERE quote_number = ?",
+                    (quotation["quote_number"],)).fetchone()[0]
+                self.conn.execute("DELETE FROM quotation_items WHERE quotation_id = ?", (quotation_id,))
+                items.extend(
+                    (quotation_id, position, item["description"], item["quantity"], item["unit_price"])
+                    for position, item in enumerate(quotation["items"])
+                )
+                values = customer_values(quotation)
+                if values[0]:
+                    customers.append(values)
+            self.conn.executemany(
+                "INSERT INTO quotation_items (quotation_id, position, description, quantity, unit_price) "
+                "VALUES (?, ?, ?, ?, ?)", items)
+            self.conn.executemany(UPSERT_CUSTOMER, customers)
+
+    def get(self, quote_number):
+        # Returns a normalized quotation record, ready for rendering
+        row = self.conn.execute(
+            "SELECT * FROM quotations WHERE quote_number = ?", (quote_number,)).fetchone()
+        if row is None:
+            return None
+        return self._load(row)
+
+    def _load(self, row):
+        quotation = {c: row[c] for c in QUOTE_COLUMNS if c not in ("subtotal", "total")}
+        quotation["items"] = [
+            {"description": item["description"], "quantity": item["quantity"],
+             "unit_price": item["unit_price"]}
+            for item in self.conn.execute(
+                "SELECT description, quantity, unit_price FROM quotation_items "
+                "WHERE quotation_id = ? ORDER BY position", (row["id"],))
+        ]
+        return quotation
+
+    def _where(self, quote_number=None, customer_id=None, date_from=None, date_to=None,
+               valid_on=None):
+        # Every filter maps onto an indexed column; the quote number filter is
+        # a prefix match written as a range so it can use the unique index
+        clauses = []
+        params = []
+        if quote_number:
+            clauses.append("quote_number >= ? AND quote_number < ?")
+            params += [quote_number, quote_number + "\uffff"]
+        if customer_id:
+            clauses.append("customer_id = ?")
+            params.append(customer_id)
+        if date_from:
+            clauses.append("issue_date >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append("issue_date <= ?")
+            params.append(date_to)
+        if valid_on:
+            clauses.append("valid_until >= ?")
+            params.append(valid_on)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def count(self, **filters):
+        where, params = self._where(**filters)
+        return self.conn.execute(f"SELECT COUNT(*) FROM quotations{where}", params).fetchone()[0]
+
+    def iter_quotations(self, **filters):
+        # Yields full quotation records oldest first, one at a time, so a large
+        # range never has to be held in memory
+        where, params = self._where(**filters)
+        cursor = self.conn.execute(
+            f"SELECT * FROM quotations{where} ORDER BY issue_date, quote_number", params)
+        for row in cursor:
+            yield self._load(row)
+
+    def search(self, limit=200, **filters):
+        where, params = self._where(**filters)
+        sql = (f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM quotations{where} "
+               f"ORDER BY issue_date DESC, quote_number DESC LIMIT ?")
+        return [dict(row) for row in self.conn.execute(sql, params + [limit])]
@@ -0,0 +1,41 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from customers import CustomerDirectory
+
+
+class CustomerSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = CustomerDirectory(":memory:")
+        self.directory.save({"customer_id": "C1", "customer_name": "Ravi Perera",
+                             "customer_phone": "+94 77 156 4842"})
+        self.directory.save({"customer_id": "C2", "customer_name": "Sunil Silva",
+                             "customer_phone": "071 234 5678"})
+        self.directory.load()
+        # Search the index, not the recently used customers
+        self.directory.recent.clear()
+
+    def tearDown(self):
+        self.directory.close()
+
+    def found(self, text):
+        return [customer["customer_id"] for customer in self.directory.search(text)]
+
+    def test_international_number_is_found_in_local_form(self):
+        self.assertEqual(self.found("0771564"), ["C1"])
+        self.assertEqual(self.found("077 156 4842"), ["C1"])
+
+    def test_local_number_is_found_in_international_form(self):
+        self.assertEqual(self.found("+94 71 234"), ["C2"])
+        self.assertEqual(self.found("0094 712"), ["C2"])
+
+    def test_end_of_number(self):
+        self.assertEqual(self.found("4842"), ["C1"])
+        self.assertEqual(self.found("5678"), ["C2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
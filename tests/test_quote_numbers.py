@@ -0,0 +1,98 @@
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quotation import normalize_quotation
+from quote_numbers import QuoteNumberAllocator
+from store import QuotationStore
+
+PREFIX = "T-"
+
+
+def issue_numbers(path, count, results_path, close):
+    # Runs in a child process. The numbers go to a file, so they are there
+    # even when the process ends without cleaning up.
+    allocator = QuoteNumberAllocator(path, block_size=20, prefix=PREFIX)
+    with open(results_path, "w") as f:
+        for _ in range(count):
+            f.write(allocator.next_number() + "\n")
+            f.flush()
+    if close:
+        allocator.close()
+    else:
+        # Like a crashed worker: the lease is left behind, its progress only
+        # in the lease's progress file
+        os._exit(0)
+
+
+def number_of(quote_number):
+    return int(quote_number[len(PREFIX):])
+
+
+class QuoteNumberAllocatorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "quotations.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def sequence_end(self):
+        with sqlite3.connect(self.path) as conn:
+            return conn.execute("SELECT next FROM quote_sequences WHERE prefix = ?", (PREFIX,)).fetchone()[0] - 1
+
+    def test_processes_share_the_sequence_without_duplicates_or_gaps(self):
+        # Four processes, two of which exit without closing their allocator
+        processes = []
+        for n in range(4):
+            results_path = os.path.join(self.tmp.name, f"worker-{n}.txt")
+            process = multiprocessing.Process(target=issue_numbers,
+                                              args=(self.path, 250, results_path, n % 2 == 0))
+            process.start()
+            processes.append((process, results_path))
+        issued = []
+        for process, results_path in processes:
+            process.join(60)
+            self.assertEqual(process.exitcode, 0)
+            with open(results_path) as f:
+                issued.extend(number_of(line) for line in f.read().split())
+        self.assertEqual(len(issued), 1000)
+        self.assertEqual(len(set(issued)), 1000)
+
+        # Every number leased but not issued, including those of the dead
+        # processes, is issued again before the sequence moves on
+        end = self.sequence_end()
+        with QuoteNumberAllocator(self.path, block_size=20, prefix=PREFIX) as allocator:
+            issued.extend(number_of(allocator.next_number()) for _ in range(end - len(issued)))
+            self.assertEqual(sorted(issued), list(range(1, end + 1)))
+            self.assertEqual(number_of(allocator.next_number()), end + 1)
+
+    def test_returned_numbers_are_issued_again(self):
+        with QuoteNumberAllocator(self.path, block_size=5, prefix=PREFIX) as first:
+            numbers = [first.next_number() for _ in range(3)]
+            self.assertEqual(numbers, ["T-00001", "T-00002", "T-00003"])
+            # The last number issued goes back onto the lease
+            first.return_number("T-00003")
+            self.assertEqual(first.next_number(), "T-00003")
+            # An earlier one is leased on its own to the next process
+            first.return_number("T-00002")
+            with QuoteNumberAllocator(self.path, block_size=5, prefix=PREFIX) as second:
+                self.assertEqual(second.next_number(), "T-00002")
+                self.assertEqual(second.next_number(), "T-00006")
+            self.assertEqual(first.next_number(), "T-00004")
+
+    def test_numbers_typed_in_by_hand_are_passed_over(self):
+        with QuoteNumberAllocator(self.path, block_size=1, prefix=PREFIX) as allocator:
+            self.assertEqual(allocator.next_number(), "T-00001")
+            with QuotationStore(self.path) as store:
+                store.save(normalize_quotation({"quote_number": "T-00002", "customer_name": "By hand"}))
+            self.assertEqual(allocator.next_number(), "T-00003")
+
+
+if __name__ == "__main__":
+    unittest.main()
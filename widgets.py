@@ -0,0 +1,585 @@
+import base64
+import queue
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk
+
+from pricing import QTY_SCALE, format_cents, format_quantity, to_cents, to_milli
+
+# Keys that move through suggestions rather than change the text
+NAVIGATION_KEYS = {"Up", "Down", "Return", "KP_Enter", "Escape", "Tab", "ISO_Left_Tab",
+                   "Shift_L", "Shift_R", "Control_L", "Control_R", "Alt_L", "Alt_R"}
+
+
+def set_entry_text(entry, text):
+    # Rewrite an Entry only when its text actually changes
+    if entry.get() != text:
+        entry.delete(0, tk.END)
+        entry.insert(0, text)
+
+
+class UpdateScheduler:
+    # Debounces work onto the Tk event loop. mark(key) records a dirty key and
+    # flush(keys) runs once, `delay` ms after the latest mark, with every key
+    # marked since the last pass. A steady stream of marks (holding a key down,
+    # pasting) still flushes at least every `max_delay` ms.
+    def __init__(self, widget, flush, delay=40, max_delay=200):
+        self.widget = widget
+        self.callback = flush
+        self.delay = delay
+        self.max_delay = max_delay
+        self.dirty = set()
+        self._after_id = None
+        self._first_mark = None
+
+    def mark(self, key=None):
+        self.dirty.add(key)
+        now = time.monotonic()
+        if self._after_id is not None:
+            if (now - self._first_mark) * 1000 >= self.max_delay:
+                return
+            self.widget.after_cancel(self._after_id)
+        else:
+            self._first_mark = now
+        self._after_id = self.widget.after(self.delay, self._run)
+
+    def _run(self):
+        self._after_id = None
+        self.flush()
+
+    def flush(self):
+        # Also called directly when an up-to-date result is needed right away
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        if not self.dirty:
+            return
+        keys, self.dirty = self.dirty, set()
+        self.callback(keys)
+
+
+class AutocompletePopup:
+    # Suggestion list shown below an Entry. search(text) returns (label, value)
+    # pairs and on_select(value) is called with the chosen one. The list never
+    # takes the keyboard focus, so typing carries on in the Entry.
+    def __init__(self, entry, search, on_select, rows=8):
+        self.entry = entry
+        self.search = search
+        self.on_select = on_select
+        self.rows = rows
+        self.values = []
+
+        self.window = tk.Toplevel(entry)
+        self.window.withdraw()
+        self.window.overrideredirect(True)
+        self.listbox = tk.Listbox(self.window, height=rows, width=60, takefocus=0,
+                                  exportselection=False, activestyle="none")
+        self.listbox.pack(fill=tk.BOTH, expand=True)
+        self.listbox.bind("<Button-1>", self._on_click)
+
+    @property
+    def active(self):
+        return bool(self.values)
+
+    def show_matches(self, text):
+        results = self.search(text) if text.strip() else []
+        if not results:
+            self.hide()
+            return
+        self.values = [value for label, value in results]
+        self.listbox.delete(0, tk.END)
+        for label, value in results:
+            self.listbox.insert(tk.END, label)
+        self.listbox.configure(height=min(len(results), self.rows))
+        self._select(0)
+        x = self.entry.winfo_rootx()
+        y = self.entry.winfo_rooty() + self.entry.winfo_height()
+        self.window.geometry(f"+{x}+{y}")
+        self.window.deiconify()
+        self.window.lift()
+
+    def hide(self):
+        if self.values:
+            self.values = []
+            self.window.withdraw()
+
+    def _select(self, position):
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(position)
+        self.listbox.see(position)
+
+    def move(self, step):
+        if self.values:
+            selection = self.listbox.curselection()
+            position = (selection[0] if selection else -1) + step
+            self._select(max(0, min(position, len(self.values) - 1)))
+        return "break"
+
+    def accept(self):
+        selection = self.listbox.curselection()
+        if not self.values or not selection:
+            return
+        value = self.values[selection[0]]
+        self.hide()
+        self.on_select(value)
+
+    def _on_click(self, event):
+        # Handled here instead of by the Listbox class binding, which would
+        # move the focus away from the Entry
+        self._select(self.listbox.nearest(event.y))
+        self.accept()
+        return "break"
+
+
+class ItemGrid(ttk.Frame):
+    # Line item table drawn by a single ttk.Treeview. Only the visible rows are
+    # painted by Tk, and one shared Entry is placed over a cell while it is
+    # being edited, so the widget count does not grow with the item count.
+    COLUMNS = ("number", "description", "quantity", "unit_price", "amount")
+    EDITABLE = ("description", "quantity", "unit_price")
+
+    def __init__(self, parent, store, height=10, on_change=None, catalog=None):
+        super().__init__(parent)
+        self.store = store
+        self.on_change = on_change
+        self.catalog = catalog
+        # Values last written to each tree row, so unchanged rows are skipped
+        self.shown = {}
+        # Rows edited by typing, recalculated together once typing pauses
+        self.row_updates = UpdateScheduler(self, self._update_rows)
+
+        self.tree = ttk.Treeview(self, columns=self.COLUMNS, show="headings",
+                                 height=height, selectmode="browse")
+        scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+
+        headings = {
+            "number": ("No.", 50, "center"),
+            "description": ("Description", 360, "w"),
+            "quantity": ("Quantity", 90, "e"),
+            "unit_price": ("Unit Price (Rs)", 130, "e"),
+            "amount": ("Amount (Rs)", 130, "e"),
+        }
+        for column, (text, width, anchor) in headings.items():
+            self.tree.heading(column, text=text)
+            self.tree.column(column, width=width, anchor=anchor,
+                             stretch=(column == "description"))
+
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        # Shared cell editor
+        self.editor = ttk.Entry(self.tree)
+        self.editing = None
+        self.editor.bind("<Return>", self._on_editor_return)
+        self.editor.bind("<Tab>", lambda e: self._commit_and_move(1))
+        self.editor.bind("<Shift-Tab>", lambda e: self._commit_and_move(-1))
+        self.editor.bind("<ISO_Left_Tab>", lambda e: self._commit_and_move(-1))
+        self.editor.bind("<Escape>", self._on_editor_escape)
+        self.editor.bind("<FocusOut>", lambda e: self.commit_edit())
+        self.editor.bind("<KeyRelease>", self.calculate_row_amount)
+
+        # Catalog suggestions for the description column
+        self.completer = None
+        if catalog is not None:
+            self.completer = AutocompletePopup(self.editor, self._catalog_matches,
+                                               self._apply_catalog_entry)
+            self.editor.bind("<Down>", lambda e: self.completer.move(1))
+            self.editor.bind("<Up>", lambda e: self.completer.move(-1))
+
+        self.tree.bind("<Double-1>", self._on_double_click)
+        self.tree.bind("<Return>", self._on_return)
+        self.tree.bind("<F2>", self._on_return)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(sequence, lambda e: self.commit_edit(), add="+")
+
+    def _yview(self, *args):
+        # The editor is placed in tree coordinates, so close it before scrolling
+        self.commit_edit()
+        self.tree.yview(*args)
+
+    def _values(self, index):
+        row = self.store.row(index)
+        return (f"{index + 1}.", row["description"], format_quantity(row["quantity"]),
+                format_cents(row["unit_price"]), format_cents(row["amount"]))
+
+    def append_row(self, description="", quantity=QTY_SCALE, unit_price=0):
+        index = self.store.append(description, quantity, unit_price)
+        values = self.shown[index] = self._values(index)
+        self.tree.insert("", "end", iid=str(index), values=values)
+        return index
+
+    def pop_row(self):
+        self.cancel_edit()
+        index = len(self.store) - 1
+        self.store.pop()
+        self.shown.pop(index, None)
+        self.tree.delete(str(index))
+
+    def load_rows(self, rows):
+        # Replace every row with (description, quantity, unit_price) tuples
+        self.cancel_edit()
+        self.tree.delete(*self.tree.get_children())
+        self.store.clear()
+        self.shown.clear()
+        for description, quantity, unit_price in rows:
+            self.append_row(description, quantity, unit_price)
+
+    def add_rows(self, rows):
+        # Write (description, quantity, unit_price) tuples into the blank lines
+        # at the end of the table, appending more lines once those run out.
+        # Returns the indices written.
+        self.commit_edit()
+        start = len(self.store)
+        while start > 0 and self._is_blank(start - 1):
+            start -= 1
+        written = []
+        for index, (description, quantity, unit_price) in enumerate(rows, start):
+            if index < len(self.store):
+                self.store.update(index, description, quantity, unit_price)
+                self.refresh_row(index)
+            else:
+                self.append_row(description, quantity, unit_price)
+            written.append(index)
+        if written and self.on_change:
+            self.on_change(written)
+        return written
+
+    def _is_blank(self, index):
+        return (not self.store.descriptions[index] and self.store.quantities[index] == QTY_SCALE
+                and not self.store.unit_prices[index])
+
+    def refresh_row(self, index):
+        # Returns whether the row's text changed
+        values = self._values(index)
+        if self.shown.get(index) == values:
+            return False
+        self.shown[index] = values
+        self.tree.item(str(index), values=values)
+        return True
+
+    def clear_values(self):
+        self.cancel_edit()
+        for index in range(len(self.store)):
+            self.store.reset(index)
+            self.refresh_row(index)
+
+    def _on_double_click(self, event):
+        iid = self.tree.identify_row(event.y)
+        column = self.tree.identify_column(event.x)
+        if not iid or not column:
+            return
+        name = self.COLUMNS[int(column[1:]) - 1]
+        if name not in self.EDITABLE:
+            name = "description"
+        self.begin_edit(int(iid), name)
+
+    def _on_return(self, event):
+        selection = self.tree.selection()
+        if selection:
+            self.begin_edit(int(selection[0]), "description")
+
+    def begin_edit(self, index, column):
+        self.commit_edit()
+        iid = str(index)
+        self.tree.see(iid)
+        self.tree.selection_set(iid)
+        self.tree.update_idletasks()
+        bbox = self.tree.bbox(iid, column)
+        if not bbox:
+            return
+        x, y, width, height = bbox
+        row = self.store.row(index)
+        if column == "description":
+            text = row["description"]
+        elif column == "quantity":
+            text = format_quantity(row["quantity"])
+        else:
+            text = format_cents(row["unit_price"])
+
+        if column == "description" and self.catalog is not None:
+            # First description edit starts reading the catalog in the background
+            self.catalog.load_async()
+
+        self.editing = (index, column)
+        self.editor.delete(0, tk.END)
+        self.editor.insert(0, text)
+        self.editor.select_range(0, tk.END)
+        self.editor.place(x=x, y=y, width=width, height=height)
+        self.editor.focus_set()
+
+    def commit_edit(self):
+        if self.editing is None:
+            return
+        index, column = self.editing
+        self.editing = None
+        self._hide_completer()
+        self.editor.place_forget()
+        text = self.editor.get()
+        try:
+            if column == "description":
+                self.store.update(index, description=text)
+            elif column == "quantity":
+                self.store.update(index, quantity=to_milli(text))
+            else:
+                self.store.update(index, unit_price=to_cents(text))
+        except ValueError:
+            self.bell()
+            return
+        if self.refresh_row(index) and self.on_change:
+            self.on_change([index])
+
+    def calculate_row_amount(self, event=None):
+        # Recalculate the row being edited as the user types, so the amount
+        # and the running totals update before the edit is committed. The
+        # work is debounced: a burst of keystrokes costs one update pass.
+        if self.editing is None:
+            return
+        index, column = self.editing
+        if column == "description":
+            if self.completer and (event is None or event.keysym not in NAVIGATION_KEYS):
+                self.completer.show_matches(self.editor.get())
+            return
+        self.row_updates.mark(index)
+
+    def _update_rows(self, indices):
+        changed = []
+        for index in sorted(indices):
+            if index >= len(self.store):
+                continue
+            if self.editing is not None and self.editing[0] == index:
+                column = self.editing[1]
+                try:
+                    if column == "quantity":
+                        self.store.update(index, quantity=to_milli(self.editor.get()))
+                    elif column == "unit_price":
+                        self.store.update(index, unit_price=to_cents(self.editor.get()))
+                except ValueError:
+                    # Half-typed number; keep the last good value
+                    continue
+            if self.refresh_row(index):
+                changed.append(index)
+        if changed and self.on_change:
+            self.on_change(changed)
+
+    def cancel_edit(self):
+        if self.editing is not None:
+            self.editing = None
+            self._hide_completer()
+            self.editor.place_forget()
+
+    def _hide_completer(self):
+        if self.completer:
+            self.completer.hide()
+
+    def _on_editor_return(self, event):
+        if self.completer and self.completer.active:
+            self.completer.accept()
+            return "break"
+        return self._commit_and_move(0)
+
+    def _on_editor_escape(self, event):
+        if self.completer and self.completer.active:
+            self.completer.hide()
+        else:
+            self.cancel_edit()
+        return "break"
+
+    def _catalog_matches(self, text):
+        return [(f"{entry['description']}  -  Rs {format_cents(entry['unit_price'], grouping=True)}", entry)
+                for entry in self.catalog.search(text, limit=8)]
+
+    def _apply_catalog_entry(self, entry):
+        # Fill in the description and unit price, then move on to the quantity
+        if self.editing is None:
+            return
+        index = self.editing[0]
+        self.editor.delete(0, tk.END)
+        self.editor.insert(0, entry["description"])
+        self.store.update(index, unit_price=entry["unit_price"])
+        self._commit_and_move(1)
+
+    def _commit_and_move(self, step):
+        if self.editing is None:
+            return "break"
+        index, column = self.editing
+        self.commit_edit()
+        if step:
+            position = self.EDITABLE.index(column) + step
+            if 0 <= position < len(self.EDITABLE):
+                self.begin_edit(index, self.EDITABLE[position])
+            elif position >= len(self.EDITABLE) and index + 1 < len(self.store):
+                self.begin_edit(index + 1, self.EDITABLE[0])
+            elif position < 0 and index > 0:
+                self.begin_edit(index - 1, self.EDITABLE[-1])
+        else:
+            self.tree.focus_set()
+            self.tree.focus(str(index))
+        return "break"
+
+
+class PdfPreview(ttk.Frame):
+    # Scrollable page-by-page view of a PDF. Pages are laid out as blank
+    # placeholders at the width of the pane and rasterized (through a
+    # preview.PageImageCache, on a background thread) only once they scroll
+    # near the view, so long quotes open at once.
+    GAP = 8
+
+    def __init__(self, parent, cache, width=420):
+        super().__init__(parent)
+        self.cache = cache
+        self.canvas = tk.Canvas(self, width=width, bg="#7f7f7f", highlightthickness=0)
+        scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._yview)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.pdf_path = None
+        self.digest = None
+        self.sizes = []
+        self.dpi = None
+        # (top, width, height) in pixels of each page at self.dpi
+        self.layout = []
+        # Page images on the canvas; Tk drops an image once nothing refers to it
+        self.images = {}
+        self.requested = set()
+        # Bumped for every new document and relayout, so stale results are dropped
+        self.generation = 0
+
+        # Newest requests first: the pages just scrolled to matter most
+        self.jobs = queue.LifoQueue()
+        self.results = queue.Queue()
+        self.worker = None
+        self.pending = 0
+        self._polling = False
+
+        self.visible_updates = UpdateScheduler(self, lambda keys: self._request_visible(), delay=30)
+        self.resize_updates = UpdateScheduler(self, lambda keys: self._relayout(), delay=100, max_delay=300)
+        self.canvas.bind("<Configure>", lambda e: self.resize_updates.mark())
+        self.canvas.bind("<MouseWheel>", self._on_mousewheel)
+
+    def show(self, pdf_path, digest):
+        # digest is the quotation's content hash: it keys the page image cache
+        self.pdf_path = pdf_path
+        self.digest = digest
+        self.sizes = []
+        self.dpi = None
+        self.layout = []
+        self.generation += 1
+        self.canvas.delete("all")
+        self.images.clear()
+        self.requested.clear()
+        self.canvas.yview_moveto(0)
+        self._submit(("sizes", pdf_path, digest))
+
+    def _yview(self, *args):
+        self.canvas.yview(*args)
+        self.visible_updates.mark()
+
+    def _on_mousewheel(self, event):
+        self.canvas.yview_scroll(int(-1*(event.delta/120)), "units")
+        self.visible_updates.mark()
+
+    def _relayout(self):
+        if not self.sizes:
+            return
+        # Fit the widest page to the pane; dpi moves in steps of 6 so that
+        # small resizes reuse cached pages
+        width = max(self.canvas.winfo_width() - 2 * self.GAP, 100)
+        widest = max(page_width for page_width, page_height in self.sizes)
+        dpi = max(6, int(72 * width / widest) // 6 * 6)
+        if dpi == self.dpi:
+            self._request_visible()
+            return
+
+        self.dpi = dpi
+        self.generation += 1
+        self.canvas.delete("all")
+        self.images.clear()
+        self.requested.clear()
+        self.layout = []
+        top = self.GAP
+        for page_width, page_height in self.sizes:
+            width, height = round(page_width * dpi / 72), round(page_height * dpi / 72)
+            self.layout.append((top, width, height))
+            self.canvas.create_rectangle(self.GAP, top, self.GAP + width, top + height,
+                                         fill="white", outline="#5f5f5f")
+            top += height + self.GAP
+        widest_px = max(width for _, width, _ in self.layout)
+        self.canvas.configure(scrollregion=(0, 0, widest_px + 2 * self.GAP, top))
+        self._request_visible()
+
+    def _request_visible(self):
+        # Rasterize the pages in view, plus the next one so it is ready
+        if not self.layout:
+            return
+        view_top = self.canvas.canvasy(0)
+        view_bottom = view_top + self.canvas.winfo_height()
+        wanted = [index for index, (top, width, height) in enumerate(self.layout)
+                  if top + height >= view_top and top <= view_bottom]
+        if wanted and wanted[-1] + 1 < len(self.layout):
+            wanted.append(wanted[-1] + 1)
+        # Queued in reverse, so the LIFO worker starts with the topmost page
+        for index in reversed(wanted):
+            if index not in self.requested:
+                self.requested.add(index)
+                self._submit(("page", self.pdf_path, self.digest, index, self.dpi))
+
+    def _submit(self, job):
+        self.jobs.put((self.generation,) + job)
+        if self.worker is None:
+            self.worker = threading.Thread(target=self._work, daemon=True)
+            self.worker.start()
+        self.pending += 1
+        if not self._polling:
+            self._polling = True
+            self.after(30, self._poll)
+
+    def _work(self):
+        # Runs off the Tk thread: must not touch any widget
+        while True:
+            generation, kind, *args = self.jobs.get()
+            if generation != self.generation:
+                # Answered anyway, so the Tk side can count outstanding jobs
+                self.results.put((generation, "stale", None))
+                continue
+            try:
+                if kind == "sizes":
+                    result = self.cache.page_sizes(*args)
+                else:
+                    pdf_path, digest, index, dpi = args
+                    result = (index, self.cache.page(pdf_path, digest, index, dpi))
+                self.results.put((generation, kind, result))
+            except Exception as e:
+                self.results.put((generation, "error", e))
+
+    def _poll(self):
+        try:
+            while True:
+                generation, kind, result = self.results.get_nowait()
+                self.pending -= 1
+                if generation != self.generation:
+                    continue
+                if kind == "sizes":
+                    self.sizes = result
+                    self._relayout()
+                elif kind == "page":
+                    self._draw_page(*result)
+                else:
+                    self.canvas.delete("all")
+                    self.canvas.create_text(self.GAP, self.GAP, anchor="nw", fill="white",
+                                            width=max(self.canvas.winfo_width() - 2 * self.GAP, 100),
+                                            text=f"Preview failed: {result}")
+        except queue.Empty:
+            pass
+        if self.pending:
+            self.after(30, self._poll)
+        else:
+            self._polling = False
+
+    def _draw_page(self, index, png):
+        top, width, height = self.layout[index]
+        image = tk.PhotoImage(data=base64.b64encode(png))
+        self.images[index] = image
+        self.canvas.create_image(self.GAP, top, image=image, anchor="nw")